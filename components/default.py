@@ -2,17 +2,23 @@
 
 from typing import List
 import uuid
-import httpx
+import threading
 from tqdm import tqdm
-from qdrant_client.http.models import PointStruct
-from qdrant_client.http.models import HnswConfigDiff
-from qdrant_client.models import VectorParams, Distance
-from qdrant_client.local.qdrant_local import QdrantLocal
+from utils.lazy import lazy
 from utils.registry import register
 from utils.document import Document
 from utils.readers import html_to_md
-from utils.ollama_utils import ollama_model, ollama_chat_completion, ollama_embed
+from utils.ollama_utils import ollama_model, ollama_chat_completion, ollama_embed, ollama_preload
 from utils.splitters import split_by_const
+from utils.tracing import annotate, span
+from utils.context import approx_tokens, pack_documents
+from utils.rerank import rerank_documents
+from utils.fnuser import QUIET
+
+# imported on first use, so loading the pipeline stays fast
+httpx = lazy("httpx")
+qdrant_models = lazy("qdrant_client.models")
+qdrant_local = lazy("qdrant_client.local.qdrant_local")
 
 
 @register("indexer")
@@ -30,18 +36,18 @@ async def default_indexer(paths: str,
     if not ollama_model(ollama_embedding_model):
         return False
     paths = paths.split()
-    client = QdrantLocal(save)
+    client = qdrant_local.QdrantLocal(save)
     result = True
     try:
         http_client = httpx.AsyncClient(headers={'User-Agent': 'Mozilla/5.0 (Windows NT 11.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/134.0.6998.166 Safari/537.36'})
         if client.collection_exists(collection_name=name) is False:
             client.create_collection(
                 collection_name=name,
-                vectors_config=VectorParams(
+                vectors_config=qdrant_models.VectorParams(
                     size=ollama_embedding_model_dim,
-                    distance=Distance.COSINE,
+                    distance=qdrant_models.Distance.COSINE,
                     on_disk=True,
-                    hnsw_config=HnswConfigDiff(ef_construct=100, m=16, on_disk=True)),
+                    hnsw_config=qdrant_models.HnswConfigDiff(ef_construct=100, m=16, on_disk=True)),
                 on_disk_payload=True
             )
         for path in tqdm(paths):
@@ -51,7 +57,7 @@ async def default_indexer(paths: str,
             response = await ollama_embed(ollama_host, ollama_timeout, ollama_embedding_model, texts)
             embs = response["embeddings"]
             for emb, text in zip(embs, texts):
-                points.append(PointStruct(id=uuid.uuid4().hex, vector=emb, payload={"text": text}))
+                points.append(qdrant_models.PointStruct(id=uuid.uuid4().hex, vector=emb, payload={"text": text}))
             client.upsert(
                 collection_name=name,
                 points=points
@@ -63,45 +69,138 @@ async def default_indexer(paths: str,
     return result
 
 
+def point_metadata(point) -> dict:
+    """Document metadata of qdrant search hit"""
+    metadata = {"score": point.score}
+    if point.vector is not None:
+        metadata["vector"] = point.vector
+    return metadata
+
+
 @register("retriever")
 async def default_retriever(query: str,
                             save: str = "./qdrant/",
                             name: str = "test_collection",
                             ollama_host: str = "http://localhost:11434",
                             ollama_embedding_model: str = "bge-m3:567m",
-                            ollama_timeout: int = 60) -> List[Document]:
-    """My retriever"""
-    k = 1
+                            ollama_timeout: int = 60,
+                            k: int = 1,
+                            with_vectors: bool = False) -> List[Document]:
+    """
+    My retriever, documents have similarity in metadata["score"]
+    and with with_vectors their embedding in metadata["vector"] (for mmr_reranker)
+    """
     documents = []
     if not ollama_model(ollama_embedding_model):
         return []
-    client = QdrantLocal(save)
+    client = qdrant_local.QdrantLocal(save)
     try:
         if client.collection_exists(collection_name=name) is False:
             print(f"No '{name}' collection")
             return []
-        response = await ollama_embed(ollama_host, ollama_timeout, ollama_embedding_model, [query])
+        with span("embed", model=ollama_embedding_model, texts=1):
+            response = await ollama_embed(ollama_host, ollama_timeout, ollama_embedding_model, [query])
         query_vector = response["embeddings"][0]
-        top_k_results = client.search(
-            collection_name=name,
-            query_vector=query_vector,
-            limit=k,
-            with_payload=True,
-        )
+        with span("vector_search", collection=name, k=k) as search:
+            top_k_results = client.search(
+                collection_name=name,
+                query_vector=query_vector,
+                limit=k,
+                with_payload=True,
+                with_vectors=with_vectors,
+            )
+            if search is not None:
+                search["attrs"]["hits"] = len(top_k_results)
         for point in top_k_results:
-            documents.append(Document(point.payload["text"]))
+            documents.append(Document(point.payload["text"], point_metadata(point)))
     except Exception as e:
         print(e)
     del client
     return documents
 
 
+async def default_retriever_batch(queries: List[str],
+                                  save: str = "./qdrant/",
+                                  name: str = "test_collection",
+                                  ollama_host: str = "http://localhost:11434",
+                                  ollama_embedding_model: str = "bge-m3:567m",
+                                  ollama_timeout: int = 60,
+                                  k: int = 1,
+                                  with_vectors: bool = False) -> List[List[Document]]:
+    """Batch variant of default_retriever, queries are embedded in few requests"""
+    embed_batch = 64
+    results = [[] for _ in queries]
+    if not ollama_model(ollama_embedding_model):
+        return results
+    client = qdrant_local.QdrantLocal(save)
+    try:
+        if client.collection_exists(collection_name=name) is False:
+            print(f"No '{name}' collection")
+            return results
+        for start in range(0, len(queries), embed_batch):
+            with span("embed", model=ollama_embedding_model, texts=len(queries[start:start + embed_batch])):
+                response = await ollama_embed(ollama_host, ollama_timeout, ollama_embedding_model,
+                                              queries[start:start + embed_batch])
+            for i, query_vector in enumerate(response["embeddings"], start):
+                top_k_results = client.search(
+                    collection_name=name,
+                    query_vector=query_vector,
+                    limit=k,
+                    with_payload=True,
+                    with_vectors=with_vectors,
+                )
+                results[i] = [Document(point.payload["text"], point_metadata(point)) for point in top_k_results]
+    except Exception as e:
+        print(e)
+    del client
+    return results
+
+
+default_retriever.batch = default_retriever_batch
+
+
+@register("reranker")
+async def mmr_reranker(query: str,
+                       documents: List[Document],
+                       top_n: int = 4,
+                       lexical_weight: float = 0.3,
+                       diversity: float = 0.5) -> List[Document]:
+    """
+    CPU reranker of over-fetched candidates (retriever k > top_n, with_vectors for embeddings):
+    retriever score mixed with query term overlap, then MMR drops near-duplicates
+    """
+    reranked = rerank_documents(query, documents, top_n, lexical_weight, diversity)
+    annotate(candidates=len(documents))
+    return reranked
+
+
 @register("augmenter")
 async def default_augmenter(query: str, documents: List[Document]) -> str:
     """My augmenter"""
     return "По запросу '" + query + "' найдена следующая информация:\n" + "\n\n".join([d.utf8_content for d in documents])
 
 
+@register("augmenter")
+async def budget_augmenter(query: str,
+                           documents: List[Document],
+                           num_ctx: int = 4096,
+                           reserve_tokens: int = 768,
+                           min_overlap: int = 64) -> str:
+    """
+    Augmenter keeping the prompt within num_ctx of the generator:
+    best scored chunks are packed into num_ctx - reserve_tokens (system prompt and answer),
+    duplicates and chunk overlaps are removed
+    """
+    header = "По запросу '" + query + "' найдена следующая информация:\n"
+    budget = num_ctx - reserve_tokens - 2 * approx_tokens(header)  # header and query are sent
+    texts, stats = pack_documents(documents, max(0, budget), min_overlap)
+    annotate(budget=budget, **stats)
+    if not QUIET.get():
+        print(f"Context: {stats['packed']}/{len(documents)} chunks packed, {stats['dropped']} dropped, "
+              f"{stats['duplicates']} duplicates, ~{stats['tokens']}/{budget} tokens")
+    return header + "\n\n".join(texts)
+
+
 @register("generator")
 async def default_generator(query: str,
                             tool_context: str,
@@ -110,8 +209,15 @@ async def default_generator(query: str,
                             temperature: float = 1.0,
                             model: str = 'gemma3:4b',
                             ollama_host: str = "http://localhost:11434",
-                            sys_prompt = "Ты — ассистент, отвечающий на запросы пользователя исходя из найденной информации.") -> bool:
-    """My generator"""
+                            sys_prompt = "Ты — ассистент, отвечающий на запросы пользователя исходя из найденной информации.",
+                            keep_alive: str = "30m",
+                            preload: bool = True) -> str | bool:  # pylint: disable=unused-argument
+    """
+    My generator.
+    keep_alive keeps the model loaded between queries. preload is not used here, it is
+    the setting of preload_generator, which loads the model when the pipeline is built.
+    Only the system prompt is a prefix shared by queries (the context starts with the query).
+    """
     # a = 1 / 0
     # print(tool_context)
     messages = [
@@ -126,5 +232,15 @@ async def default_generator(query: str,
     ]
     if not ollama_model(model):
         return False
-    await ollama_chat_completion(ollama_host, model, messages, seed=seed, num_ctx=num_ctx, temperature=temperature)
-    return True
+    return await ollama_chat_completion(ollama_host, model, messages, seed=seed, num_ctx=num_ctx,
+                                        temperature=temperature, keep_alive=keep_alive)
+
+
+def preload_generator(model: str, ollama_host: str, keep_alive: str, preload: bool, **_) -> None:
+    """Load generator model in background when pipeline is built (utils.fnuser.preload)"""
+    if preload:
+        threading.Thread(target=ollama_preload, args=(ollama_host, model, keep_alive),
+                         name="ollama-preload", daemon=True).start()
+
+
+default_generator.preload = preload_generator
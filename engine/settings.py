@@ -10,7 +10,9 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
+from django.core.exceptions import ImproperlyConfigured
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -74,21 +76,26 @@ WSGI_APPLICATION = "engine.wsgi.application"
 
 ASGI_APPLICATION = "engine.asgi.application"
 
-# CHANNEL_LAYERS = {
-#     "default": {
-#         "BACKEND": "channels_redis.core.RedisChannelLayer",
-#         "CONFIG": {
-#             "hosts": [("127.0.0.1", 6379)],
-#         },
-#     },
-# }
-
-# Channel layers - for now just use InMemory for simplicity
-CHANNEL_LAYERS = {
-    "default": {
-        "BACKEND": "channels.layers.InMemoryChannelLayer",
-    },
-}
+# Channel layers - InMemory for single process, Redis (e.g. redis://127.0.0.1:6379)
+# from KMENGINE_REDIS_URL lets several ASGI workers share pipelines: runs are routed
+# to the worker owning pipeline kernels and output goes back through pipeline groups
+KMENGINE_REDIS_URL = os.environ.get("KMENGINE_REDIS_URL")
+
+if KMENGINE_REDIS_URL:
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "channels_redis.core.RedisChannelLayer",
+            "CONFIG": {
+                "hosts": [KMENGINE_REDIS_URL],
+            },
+        },
+    }
+else:
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "channels.layers.InMemoryChannelLayer",
+        },
+    }
 
 
 # Database
@@ -98,6 +105,19 @@ DATABASES = {
    "default": {
        "ENGINE": "django.db.backends.sqlite3",
        "NAME": BASE_DIR / "db.sqlite3",
+       "OPTIONS": {
+           # WAL lets readers go on while runs are stored, IMMEDIATE transactions
+           # take write lock at start instead of failing on lock upgrade
+           "timeout": 20,
+           "transaction_mode": "IMMEDIATE",
+           "init_command": (
+               "PRAGMA journal_mode=WAL;"
+               "PRAGMA synchronous=NORMAL;"
+               "PRAGMA temp_store=MEMORY;"
+               "PRAGMA cache_size=-20000;"
+               "PRAGMA mmap_size=134217728;"
+           ),
+       },
    }
 }
 
@@ -142,3 +162,88 @@ STATIC_URL = "static/"
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+
+# Pipeline kernels
+# Kernels are shared by all websocket connections of the process.
+# Idle replicas above Config.min_replicas are shut down after KMENGINE_SCALE_DOWN_AFTER seconds,
+# any idle kernel after KMENGINE_IDLE_TIMEOUT seconds, least recently used ones
+# while more than KMENGINE_MAX_KERNELS are alive or all kernels use more than
+# KMENGINE_TOTAL_MEMORY_LIMIT megabytes (checked every KMENGINE_EVICT_INTERVAL seconds).
+# Idle kernels using more than KMENGINE_KERNEL_MEMORY_LIMIT megabytes are restarted.
+# None disables memory limits. Memory is sampled with psutil if installed, /proc otherwise
+
+KMENGINE_SCALE_DOWN_AFTER = 300
+KMENGINE_IDLE_TIMEOUT = 1800
+KMENGINE_MAX_KERNELS = 8
+KMENGINE_EVICT_INTERVAL = 60
+KMENGINE_KERNEL_MEMORY_LIMIT = 4096
+KMENGINE_TOTAL_MEMORY_LIMIT = None
+
+# Kernels are checked every KMENGINE_KERNEL_WATCH_INTERVAL seconds, dead ones and ones missing
+# KMENGINE_KERNEL_HEARTBEAT_MISSES heartbeats in a row are restarted with imports and pipeline loaded,
+# their running calculations end with 'crashed' status
+
+KMENGINE_KERNEL_WATCH_INTERVAL = 2
+KMENGINE_KERNEL_HEARTBEAT_MISSES = 3
+
+# Where runs are executed: "local" - in web server process,
+# "worker" - executed by `manage.py kmworker` processes; runs are queued to DB in both modes
+# (output reaches clients only through shared channel layer).
+# In "local" mode the queue is served from the first websocket connection on: runs queued
+# or interrupted before a restart resume only then; kmworker resumes them when it starts
+
+KMENGINE_EXECUTION = os.environ.get("KMENGINE_EXECUTION", "local")
+if KMENGINE_EXECUTION == "worker" and not KMENGINE_REDIS_URL:
+    raise ImproperlyConfigured("KMENGINE_EXECUTION=worker needs KMENGINE_REDIS_URL: "
+                               "output of worker runs reaches web clients only through shared channel layer")
+KMENGINE_WORKER_POLL = 1.0
+
+# Run queue limits: runs at once per process and for all processes (None - no limit),
+# runs of one pipeline are limited by Config.max_replicas
+
+KMENGINE_WORKER_CONCURRENCY = 4
+KMENGINE_GLOBAL_CONCURRENCY = None
+
+# Default run timeouts in seconds by run kind (None - no timeout), run command may override it.
+# Timed out and cancelled runs are interrupted, kernel is restarted
+# only if it ignores interrupt for KMENGINE_INTERRUPT_GRACE seconds
+
+KMENGINE_RUN_TIMEOUTS = {
+    "query": 600,
+    "batch": None,
+    "index": None,
+}
+KMENGINE_INTERRUPT_GRACE = 10
+
+# Pipeline ownership between workers sharing channel layer,
+# owner is considered gone after 3 missed heartbeats
+
+KMENGINE_ROUTE_RUNS = bool(KMENGINE_REDIS_URL) or KMENGINE_EXECUTION == "worker"
+KMENGINE_OWNER_HEARTBEAT = 10
+
+# Configs with executor 'inprocess' (trusted pipelines) run without kernels
+# in event loops of KMENGINE_INPROCESS_WORKERS threads of the executing process
+
+KMENGINE_INPROCESS_WORKERS = 2
+
+# Read-only queries of websocket commands run in KMENGINE_DB_READ_THREADS threads,
+# Calculation writes are gathered for KMENGINE_DB_FLUSH_INTERVAL seconds into one transaction
+
+KMENGINE_DB_READ_THREADS = 4
+KMENGINE_DB_FLUSH_INTERVAL = 0.05
+
+# Config catalog of list_configs/get_config is updated on saves of this process,
+# reloaded from DB after KMENGINE_CATALOG_TTL seconds to see changes of other processes (None - never)
+
+KMENGINE_CATALOG_TTL = 60 if KMENGINE_ROUTE_RUNS else None
+
+# Websocket framing: clients offering 'kme.msgpack.v1' (msgpack installed) or 'kme.compact.v1'
+# subprotocol get binary frames, messages from KMENGINE_WS_DEFLATE_MIN bytes are zlib compressed
+
+KMENGINE_WS_DEFLATE_MIN = 4096
+
+# Stage spans of runs are stored on Calculation, with KMENGINE_TRACE_FILE set they are also
+# appended there as OpenTelemetry OTLP/JSON lines (one trace per calculation)
+
+KMENGINE_TRACE_FILE = os.environ.get("KMENGINE_TRACE_FILE")
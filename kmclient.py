@@ -1,10 +1,15 @@
 """CLI for client"""
 
+import sys
 import json
+import time
+import random
 import asyncio
-import websockets
+import bisect
 import argparse
-from subprocess import Popen, CREATE_NEW_PROCESS_GROUP, DETACHED_PROCESS, CREATE_NO_WINDOW, PIPE
+import subprocess
+from collections import deque
+import websockets
 from prompt_toolkit import PromptSession, ANSI
 from prompt_toolkit.patch_stdout import patch_stdout
 from prompt_toolkit.application import run_in_terminal
@@ -73,6 +78,185 @@ async def receive_loop(websocket):
             print_in_terminal("🔌 Connection closed.\n")
             break
 
+def server_process_options():
+    """Popen options detaching server process from this console"""
+    if sys.platform == "win32":
+        return {"creationflags": subprocess.DETACHED_PROCESS | subprocess.CREATE_NO_WINDOW
+                | subprocess.CREATE_NEW_PROCESS_GROUP}
+    return {"start_new_session": True}
+
+
+# Latency histogram bucket upper bounds, ms
+BUCKETS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000, 60000]
+
+
+class Stats:
+    """Counters and latencies of one operation"""
+
+    def __init__(self):
+        self.sent = 0
+        self.ok = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.latencies = []  # seconds
+
+    def done(self, start, ok=True):
+        """Record finished operation started at start (time.perf_counter)"""
+        if ok:
+            self.ok += 1
+        else:
+            self.errors += 1
+        self.latencies.append(time.perf_counter() - start)
+
+    def report(self, seconds):
+        """Counts, error rate, throughput, latency percentiles and histogram over seconds of the test"""
+        values = sorted(self.latencies)
+        histogram = [0] * (len(BUCKETS) + 1)
+        for v in values:
+            histogram[bisect.bisect_left(BUCKETS, 1000 * v)] += 1
+
+        def at(q):
+            return round(1000 * values[min(len(values) - 1, int(q * len(values)))], 2) if values else None
+        finished = self.ok + self.errors + self.timeouts
+        return {
+            "sent": self.sent, "ok": self.ok, "errors": self.errors, "timeouts": self.timeouts,
+            "error_rate": round((self.errors + self.timeouts) / finished, 4) if finished else None,
+            "throughput_per_s": round(self.ok / seconds, 2),
+            "p50_ms": at(0.5), "p90_ms": at(0.9), "p99_ms": at(0.99), "max_ms": at(1.0),
+            "histogram_ms": {f"<={b}" if i < len(BUCKETS) else f">{BUCKETS[-1]}": n
+                             for i, (b, n) in enumerate(zip(BUCKETS + [None], histogram)) if n},
+        }
+
+
+class LoadConnection:
+    """
+    One websocket connection of the load test.
+    Direct replies come in command order, 'Run queued' reply of a run carries its job_id,
+    runs finish with their job_id.
+    """
+
+    def __init__(self, websocket, stats, timeout):
+        self.websocket = websocket
+        self.stats = stats
+        self.timeout = timeout
+        self.replies = deque()  # (operation, start) waiting for direct reply
+        self.runs = dict()  # job_id: start
+        self.lock = asyncio.Lock()
+
+    async def send(self, operation, args):
+        """Send command and wait for its reply in order"""
+        async with self.lock:
+            self.stats[operation].sent += 1
+            self.replies.append((operation, time.perf_counter()))
+            await self.websocket.send(json.dumps({"command": operation, "args": args}))
+
+    async def receive(self):
+        """Match replies and run results to sent operations until the connection closes"""
+        async for message in self.websocket:
+            try:
+                data = json.loads(message)
+            except ValueError:
+                continue
+            if "from" in data:
+                start = self.runs.pop(data.get("job_id"), None)
+                if start is not None and data["status"] in ("ok", "error"):
+                    self.stats["run_finished"].done(
+                        start, data["status"] == "ok" and data.get("run_status", "ok") == "ok")
+            elif data.get("status") in ("ok", "error") and self.replies:
+                operation, start = self.replies.popleft()
+                self.stats[operation].done(start, data["status"] != "error")
+                if operation == "run" and "job_id" in data:
+                    self.runs[data["job_id"]] = start
+
+    def expire(self):
+        """Count operations waiting longer than timeout as timed out"""
+        now = time.perf_counter()
+        while self.replies and now - self.replies[0][1] > self.timeout:
+            self.stats[self.replies.popleft()[0]].timeouts += 1
+        for job_id, start in list(self.runs.items()):
+            if now - start > self.timeout:
+                del self.runs[job_id]
+                self.stats["run_finished"].timeouts += 1
+
+    def pending(self):
+        """Operations and runs still waiting for reply"""
+        return len(self.replies) + len(self.runs)
+
+
+def parse_mix(mix):
+    """'run:1,list_configs:4' -> {"run": 1.0, "list_configs": 4.0}"""
+    weights = dict()
+    for part in mix.split(","):
+        operation, _, weight = part.partition(":")
+        weights[operation.strip()] = float(weight or 1)
+    unknown = set(weights) - {"run", "list_configs", "list_calculations"}
+    if unknown:
+        raise ValueError(f"Unknown operations in mix: {', '.join(sorted(unknown))}")
+    return weights
+
+
+async def load_test(args):
+    """
+    Open connections, send operations of the mix at target rate (open loop, Poisson arrivals)
+    for duration seconds, wait for outstanding replies and runs, print json report.
+    """
+    weights = parse_mix(args.mix)
+    queries = ["Что такое RAG?"]
+    if args.queries:
+        with open(args.queries, "r", encoding="utf-8") as infile:
+            queries = [line.strip() for line in infile if line.strip()]
+    operations = {"run": lambda: [str(args.config_id), "false", random.choice(queries)],
+                  "list_configs": lambda: [],
+                  "list_calculations": lambda: [str(args.config_id)]}
+    stats = {name: Stats() for name in list(weights) + ["run_finished"]}
+    connections = []
+    failed_connections = 0
+    receivers = []
+    for _ in range(args.connections):
+        try:
+            websocket = await websockets.connect(args.uri, origin=args.origin, max_size=None)
+            await websocket.recv()  # greeting with help
+        except (OSError, websockets.exceptions.WebSocketException):
+            failed_connections += 1
+            continue
+        connection = LoadConnection(websocket, stats, args.timeout)
+        connections.append(connection)
+        receivers.append(asyncio.create_task(connection.receive()))
+    if not connections:
+        print(json.dumps({"error": f"Could not connect to {args.uri}"}))
+        return
+    start = time.perf_counter()
+    sends = set()
+    i = 0
+    next_at = start
+    while next_at - start < args.duration:
+        await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+        operation = random.choices(list(weights), list(weights.values()))[0]
+        connection = connections[i % len(connections)]
+        i += 1
+        task = asyncio.create_task(connection.send(operation, operations[operation]()))
+        sends.add(task)
+        task.add_done_callback(sends.discard)
+        next_at += random.expovariate(args.rate)
+    elapsed = time.perf_counter() - start
+    drain_until = time.perf_counter() + args.timeout
+    while any(c.pending() for c in connections) and time.perf_counter() < drain_until:
+        await asyncio.sleep(0.1)
+    for connection in connections:
+        connection.expire()
+        for operation, _ in connection.replies:
+            stats[operation].timeouts += 1
+        stats["run_finished"].timeouts += len(connection.runs)
+        await connection.websocket.close()
+    for receiver in receivers:
+        receiver.cancel()
+    print(json.dumps({
+        "uri": args.uri, "connections": len(connections), "failed_connections": failed_connections,
+        "target_rate": args.rate, "achieved_rate": round(i / elapsed, 2), "seconds": round(elapsed, 2),
+        "operations": {name: s.report(elapsed) for name, s in stats.items() if s.sent or s.latencies or s.timeouts},
+    }, indent=2))
+
+
 async def main(s_value):
     """Main async entry point"""
     if s_value == "cs":
@@ -87,14 +271,31 @@ async def main(s_value):
         except Exception as e:
             print_in_terminal(f"[!] Could not connect: {e}\n")
     elif s_value == "ss":
-        print("PID =", Popen(["uv", "run", "manage.py", "runserver", "--noreload"], stdin=PIPE, stdout=PIPE, stderr=PIPE, creationflags=DETACHED_PROCESS | CREATE_NO_WINDOW | CREATE_NEW_PROCESS_GROUP, close_fds=True).pid)
+        print("PID =", subprocess.Popen(["uv", "run", "manage.py", "runserver", "--noreload"],
+                                        stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                                        stderr=subprocess.DEVNULL, close_fds=True,
+                                        **server_process_options()).pid)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Kernel Manager CLI")
     parser.add_argument(
         "s",
-        choices=["cs", "ss"],
-        help="Required mode: 'cs' or 'ss'"
+        choices=["cs", "ss", "lt"],
+        help="Required mode: 'cs' (client), 'ss' (start server) or 'lt' (load test)"
     )
+    load = parser.add_argument_group("load test (lt)")
+    load.add_argument("--uri", default="ws://127.0.0.1:8000/ws/kmengine/")
+    load.add_argument("--origin", default="http://127.0.0.1:8000")
+    load.add_argument("--connections", type=int, default=10, help="Concurrent websocket connections")
+    load.add_argument("--rate", type=float, default=5.0, help="Target operations per second (all connections)")
+    load.add_argument("--duration", type=float, default=30.0, help="Seconds of sending")
+    load.add_argument("--mix", default="run:1,list_configs:4,list_calculations:2",
+                      help="Weighted operations: run, list_configs, list_calculations")
+    load.add_argument("--config-id", type=int, default=1, help="Pipeline of run and list_calculations")
+    load.add_argument("--queries", help="File with run queries, one per line")
+    load.add_argument("--timeout", type=float, default=120.0, help="Seconds before operation counts as timed out")
     args = parser.parse_args()
-    asyncio.run(main(args.s))
+    if args.s == "lt":
+        asyncio.run(load_test(args))
+    else:
+        asyncio.run(main(args.s))
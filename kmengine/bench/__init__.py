@@ -0,0 +1 @@
+"""Offline benchmark suite: fake Ollama server, static corpus server and measurements"""
@@ -0,0 +1,62 @@
+"""Static HTML corpus served locally for indexing benchmarks"""
+
+import random
+import threading
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import List
+
+WORDS = ("retrieval augmented generation вектор документ запрос ответ модель kernel pipeline "
+         "индекс поиск chunk embedding контекст token latency система данные текст результат "
+         "конвейер компонент query answer score rerank prompt сервер клиент очередь").split()
+
+
+def build_corpus(directory: Path, pages: int, paragraphs: int = 12, seed: int = 0) -> List[str]:
+    """Write deterministic html pages with headings, paragraphs and links, returns their names"""
+    rnd = random.Random(seed)
+    directory.mkdir(parents=True, exist_ok=True)
+    names = []
+    for i in range(pages):
+        body = []
+        for p in range(paragraphs):
+            body.append(f"<h2>{' '.join(rnd.choices(WORDS, k=4))}</h2>")
+            sentences = (" ".join(rnd.choices(WORDS, k=rnd.randint(8, 20))).capitalize() + "."
+                         for _ in range(rnd.randint(3, 8)))
+            body.append(f"<p>{' '.join(sentences)} <a href=\"page{(i + p + 1) % pages}.html\">далее</a></p>")
+        name = f"page{i}.html"
+        (directory / name).write_text(
+            f"<html><head><title>Page {i}</title><script>var x = {i};</script></head>"
+            f"<body><h1>Page {i}</h1>{''.join(body)}</body></html>", encoding="utf-8")
+        names.append(name)
+    return names
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class CorpusServer(ThreadingHTTPServer):
+    """Serves files of directory over http on localhost"""
+
+    daemon_threads = True
+
+    def __init__(self, directory: Path, port: int = 0):
+        super().__init__(("127.0.0.1", port), partial(_QuietHandler, directory=str(directory)))
+        self.thread: threading.Thread | None = None
+
+    def url(self, name: str) -> str:
+        """Url of the served file"""
+        return f"http://127.0.0.1:{self.server_address[1]}/{name}"
+
+    def start(self) -> "CorpusServer":
+        """Serve in a daemon thread"""
+        self.thread = threading.Thread(target=self.serve_forever, name="corpus", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stop serving and close the socket"""
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,179 @@
+"""Ollama HTTP API stand-in with deterministic embeddings and configurable speed"""
+
+import re
+import json
+import math
+import time
+import hashlib
+import threading
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List
+
+WORD = re.compile(r"\w+")
+
+
+def embedding(text: str, dim: int) -> List[float]:
+    """Unit vector of hashed words and word pairs, texts sharing words are close"""
+    vector = [0.0] * dim
+    words = WORD.findall(text.lower())
+    for feature in words + [a + " " + b for a, b in zip(words, words[1:])]:
+        digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+        index = int.from_bytes(digest[:4], "little") % dim
+        vector[index] += 1.0 if digest[4] & 1 else -1.0
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+class FakeOllama(ThreadingHTTPServer):
+    """
+    Serves /api/ps, /api/show, /api/pull, /api/embed, /api/generate and /api/chat.
+    Embedding requests take embed_latency seconds, generation answers after ttft seconds
+    with tokens tokens streamed at token_rate per second.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, port: int = 0, dim: int = 1024, embed_latency: float = 0.01,
+                 ttft: float = 0.05, token_rate: float = 200.0, tokens: int = 64):
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.dim = dim
+        self.embed_latency = embed_latency
+        self.ttft = ttft
+        self.token_rate = token_rate
+        self.tokens = tokens
+        self.requests: Dict[str, int] = dict()  # path: count
+        self.texts = 0  # embedded texts
+        self.lock = threading.Lock()
+        self.thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        """Base url for OLLAMA_HOST and ollama_host settings"""
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self) -> "FakeOllama":
+        """Serve in a daemon thread"""
+        self.thread = threading.Thread(target=self.serve_forever, name="fake-ollama", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stop serving and close the socket"""
+        self.shutdown()
+        self.server_close()
+
+    def answer(self, prompt: str) -> List[str]:
+        """Deterministic tokens of the answer to prompt"""
+        words = WORD.findall(prompt.lower()) or ["ok"]
+        seed = int.from_bytes(hashlib.blake2b(prompt.encode("utf-8"), digest_size=4).digest(), "little")
+        return [words[(seed + i * 7919) % len(words)] + " " for i in range(self.tokens)]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """Request handler of FakeOllama"""
+
+    server: FakeOllama
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def body(self) -> Dict[str, Any]:
+        """Json body of the request"""
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}") if length else dict()
+
+    def reply(self, data: Dict[str, Any], status: int = 200) -> None:
+        """Send json response"""
+        payload = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def count(self) -> None:
+        """Count request of the path"""
+        with self.server.lock:
+            self.server.requests[self.path] = self.server.requests.get(self.path, 0) + 1
+
+    def do_GET(self):
+        """Model list and version endpoints"""
+        self.count()
+        if self.path == "/api/ps":
+            self.reply({"models": []})
+        elif self.path == "/api/tags":
+            self.reply({"models": []})
+        elif self.path == "/api/version":
+            self.reply({"version": "0.0.0-fake"})
+        else:
+            self.reply({"error": "not found"}, 404)
+
+    def do_POST(self):
+        """Model, embedding and generation endpoints"""
+        self.count()
+        request = self.body()
+        if self.path == "/api/show":
+            self.reply({"modelfile": "", "parameters": "", "template": "",
+                        "details": {"family": "fake"}, "model_info": {}})
+        elif self.path == "/api/pull":
+            self.reply({"status": "success"})
+        elif self.path == "/api/embed":
+            texts = request.get("input", [])
+            texts = [texts] if isinstance(texts, str) else texts
+            with self.server.lock:
+                self.server.texts += len(texts)
+            time.sleep(self.server.embed_latency)
+            self.reply({"model": request.get("model", ""),
+                        "embeddings": [embedding(t, self.server.dim) for t in texts]})
+        elif self.path in ("/api/chat", "/api/generate"):
+            self.generate(request)
+        else:
+            self.reply({"error": "not found"}, 404)
+
+    def generate(self, request: Dict[str, Any]) -> None:
+        """Stream answer as ndjson chunks like ollama, empty prompt only loads the model"""
+        chat = self.path == "/api/chat"
+        if chat:
+            prompt = "\n".join(m.get("content", "") for m in request.get("messages", []))
+        else:
+            prompt = request.get("prompt", "")
+        tokens = self.server.answer(prompt) if prompt else []
+        start = time.perf_counter()
+
+        def chunk(text: str, done: bool) -> Dict[str, Any]:
+            data = {"model": request.get("model", ""),
+                    "created_at": datetime.now(timezone.utc).isoformat(), "done": done}
+            if chat:
+                data["message"] = {"role": "assistant", "content": text}
+            else:
+                data["response"] = text
+            if done:
+                elapsed = int(1e9 * (time.perf_counter() - start))
+                data.update(done_reason="stop", total_duration=elapsed, load_duration=0,
+                            prompt_eval_count=len(WORD.findall(prompt)),
+                            prompt_eval_duration=int(1e9 * self.server.ttft),
+                            eval_count=len(tokens), eval_duration=max(0, elapsed - int(1e9 * self.server.ttft)))
+            return data
+
+        if not request.get("stream", True):
+            time.sleep(self.server.ttft + len(tokens) / self.server.token_rate)
+            self.reply(chunk("".join(tokens), True))
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        time.sleep(self.server.ttft)
+        for token in tokens:
+            self.write_chunk(chunk(token, False))
+            time.sleep(1 / self.server.token_rate)
+        self.write_chunk(chunk("", True))
+        self.wfile.write(b"0\r\n\r\n")
+
+    def write_chunk(self, data: Dict[str, Any]) -> None:
+        """Send one ndjson line as http chunk"""
+        line = json.dumps(data, ensure_ascii=False).encode("utf-8") + b"\n"
+        self.wfile.write(f"{len(line):x}\r\n".encode("ascii") + line + b"\r\n")
+        self.wfile.flush()
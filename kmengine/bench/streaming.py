@@ -0,0 +1,71 @@
+"""Websocket framing cost: bytes and CPU per streamed token"""
+
+import json
+import time
+import zlib
+import random
+from typing import Any, Dict, List
+
+from kmengine.framing import JsonFraming, framings
+
+
+def permessage_deflate():
+    """Size of message after permessage-deflate with context takeover (RFC 7692)"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, -zlib.MAX_WBITS)
+
+    def size(data: bytes) -> int:
+        return len(compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)) - 4
+    return size
+
+
+def sample_messages(tokens: int, calculations: int, seed: int = 0):
+    """Streamed output messages and a large list_calculations reply"""
+    rnd = random.Random(seed)
+    words = ["retrieval", "вектор", "the", "of", "документ", "kernel", " ", "\n", "answer", "запрос"]
+    stream = [{"status": "output", "from": [12, 3456], "output": rnd.choice(words)}
+              for _ in range(tokens)]
+    listing = {"status": "ok", "config_id": 12, "calculations": [
+        {"id": i, "status": "ok", "input": "['12', 'false', 'что такое RAG?']",
+         "output": " ".join(rnd.choice(words) for _ in range(200)), "spans": [],
+         "created_at": " 12:00:00 19/10/2026", "updated_at": " 12:00:05 19/10/2026"}
+        for i in range(calculations)]}
+    return stream, listing
+
+
+def bench_framing(framing_cls, tokens: List[Dict[str, Any]], listing: Dict[str, Any]) -> Dict[str, Any]:
+    """Encoded sizes and encode/decode CPU time of one framing"""
+    framing = framing_cls() if framing_cls is JsonFraming else framing_cls(4096)
+    deflated = permessage_deflate()
+    wire, wire_deflated = 0, 0
+    payload = sum(len(t["output"].encode("utf-8")) for t in tokens)
+    start = time.process_time()
+    frames = [framing.encode(token) for token in tokens]
+    encode_cpu = time.process_time() - start
+    for text_data, bytes_data in frames:
+        data = text_data.encode("utf-8") if text_data is not None else bytes_data
+        wire += len(data)
+        wire_deflated += deflated(data)
+    start = time.process_time()
+    for text_data, bytes_data in frames:
+        if text_data is not None:
+            json.loads(text_data)
+        else:
+            framing.parse(bytes_data)
+    decode_cpu = time.process_time() - start
+    text_data, bytes_data = framing.encode(listing)
+    listing_bytes = len(text_data.encode("utf-8")) if text_data is not None else len(bytes_data)
+    return {
+        "framing": framing.name or "json",
+        "bytes_per_token": round(wire / len(tokens), 2),
+        "overhead_bytes_per_token": round((wire - payload) / len(tokens), 2),
+        "bytes_per_token_permessage_deflate": round(wire_deflated / len(tokens), 2),
+        "encode_us_per_token": round(1e6 * encode_cpu / len(tokens), 2),
+        "decode_us_per_token": round(1e6 * decode_cpu / len(tokens), 2),
+        "list_calculations_bytes": listing_bytes,
+    }
+
+
+def bench_streaming(tokens: int = 20000, calculations: int = 200) -> List[Dict[str, Any]]:
+    """bench_framing of JSON and every negotiable framing"""
+    stream, listing = sample_messages(tokens, calculations)
+    return [bench_framing(framing_cls, stream, listing) for framing_cls in [JsonFraming] + framings()]
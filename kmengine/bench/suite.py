@@ -0,0 +1,154 @@
+"""
+Benchmark measurements of default components against local FakeOllama and CorpusServer.
+Numbers depend only on the code and the machine, so results of different commits are comparable.
+"""
+
+import io
+import sys
+import json
+import time
+import random
+import platform
+import statistics
+import subprocess
+import contextlib
+from typing import Any, Dict, List, Optional
+
+from utils import tracing
+from .corpus import WORDS
+
+
+def percentiles(seconds: List[float]) -> Dict[str, Optional[float]]:
+    """Milliseconds statistics of durations"""
+    if not seconds:
+        return {"n": 0, "mean_ms": None, "p50_ms": None, "p95_ms": None, "p99_ms": None, "max_ms": None}
+    values = sorted(seconds)
+
+    def at(q: float) -> float:
+        return round(1000 * values[min(len(values) - 1, int(q * len(values)))], 2)
+    return {"n": len(values), "mean_ms": round(1000 * statistics.fmean(values), 2),
+            "p50_ms": round(1000 * statistics.median(values), 2), "p95_ms": at(0.95),
+            "p99_ms": at(0.99), "max_ms": round(1000 * values[-1], 2)}
+
+
+def pipeline_content(ollama_url: str, save: str, dim: int) -> str:
+    """Config of components.default pipeline using the fake server"""
+    ollama = {"ollama_host": ollama_url, "save": save, "name": "kmbench"}
+    return json.dumps({
+        "indexer": {"path": "components.default.default_indexer",
+                    "settings": dict(ollama, ollama_embedding_model_dim=dim)},
+        "retriever": {"path": "components.default.default_retriever", "settings": ollama},
+        "augmenter": {"path": "components.default.default_augmenter", "settings": {}},
+        "generator": {"path": "components.default.default_generator",
+                      "settings": {"ollama_host": ollama_url}},
+    })
+
+
+def make_queries(count: int, seed: int = 1) -> List[str]:
+    """Same random questions of corpus words for every run"""
+    rnd = random.Random(seed)
+    return [" ".join(rnd.choices(WORDS, k=rnd.randint(3, 8))) + "?" for _ in range(count)]
+
+
+def commit() -> Optional[str]:
+    """Current git commit of the tree, None outside of git checkout"""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True, timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def environment() -> Dict[str, Any]:
+    """Where results were measured"""
+    return {"commit": commit(), "python": platform.python_version(), "platform": platform.platform(),
+            "machine": platform.machine(), "time": time.strftime("%Y-%m-%dT%H:%M:%S%z")}
+
+
+async def run_request(request: Dict[str, Any]):
+    """Execute request in this process with its output suppressed, returns (seconds, spans, output)"""
+    from utils.fnuser import execute_request
+
+    spans = []
+    output = io.StringIO()
+    token = tracing.SINK.set(spans.extend)
+    start = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+            await execute_request(request)
+    finally:
+        tracing.SINK.reset(token)
+    return time.perf_counter() - start, spans, output.getvalue()
+
+
+def stages(spans: List[Dict[str, Any]]) -> Dict[str, Dict[str, Optional[float]]]:
+    """Duration percentiles of spans grouped by name"""
+    grouped: Dict[str, List[float]] = dict()
+    for s in spans:
+        grouped.setdefault(s["name"], []).append(s["duration_ms"] / 1000)
+    return {name: percentiles(values) for name, values in sorted(grouped.items())}
+
+
+async def bench_indexing(content: str, urls: List[str], fake) -> Dict[str, Any]:
+    """Pages and chunks per second of default_indexer over the corpus"""
+    texts = fake.texts
+    seconds, spans, output = await run_request({"content": content, "kind": "run", "indexer": True,
+                                                "path_or_query": " ".join(urls)})
+    chunks = fake.texts - texts
+    return {"pages": len(urls), "chunks": chunks, "seconds": round(seconds, 3),
+            "pages_per_s": round(len(urls) / seconds, 2), "chunks_per_s": round(chunks / seconds, 2),
+            "stages": stages(spans), "errors": output.count("rror")}
+
+
+async def bench_queries(content: str, queries: List[str], concurrency: int) -> Dict[str, Any]:
+    """Latency of single queries one by one, then throughput of the same queries as one batch"""
+    latencies, ttft, all_spans = [], [], []
+    for query in queries:
+        seconds, spans, _ = await run_request({"content": content, "kind": "run", "indexer": False,
+                                               "path_or_query": query})
+        latencies.append(seconds)
+        all_spans += spans
+        ttft += [s["attrs"]["ttft_ms"] / 1000 for s in spans if "ttft_ms" in s["attrs"]]
+    seconds, _, output = await run_request({"content": content, "kind": "run_batch",
+                                            "queries": queries, "concurrency": concurrency})
+    ok = sum(1 for line in output.splitlines() if line.startswith("{") and '"status": "ok"' in line)
+    return {"latency": percentiles(latencies), "ttft": percentiles(ttft), "stages": stages(all_spans),
+            "batch": {"queries": len(queries), "concurrency": concurrency, "ok": ok,
+                      "seconds": round(seconds, 3), "queries_per_s": round(len(queries) / seconds, 2)}}
+
+
+def bench_kernel_startup(content: str, kernels: int) -> Dict[str, Any]:
+    """Time to a ready kernel, to KERNEL_INIT imports and to loaded pipeline components"""
+    from kmengine.consumers import KERNEL_INIT, KernelCLI
+
+    cli = KernelCLI()
+    ready, init, pipeline, failed = [], [], [], 0
+    output: List[str] = []
+    try:
+        for _ in range(kernels):
+            start = time.perf_counter()
+            kernel_id = cli.km.start_kernel(kernel_name="python3")
+            client = cli.km.get_kernel(kernel_id).client()
+            client.start_channels()
+            client.wait_for_ready(timeout=60)
+            client.stop_channels()
+            ready.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            ok = cli.execute(kernel_id, KERNEL_INIT, output.append, False) == "ok"
+            init.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            ok = cli.execute(kernel_id, cli.pipeline_code(content), output.append, False) == "ok" and ok
+            pipeline.append(time.perf_counter() - start)
+            failed += not ok
+            cli.km.shutdown_kernel(kernel_id, now=True)
+    finally:
+        cli.shutdown_all_kernels()
+    return {"kernels": kernels, "failed": failed, "ready": percentiles(ready),
+            "init_imports": percentiles(init), "load_pipeline": percentiles(pipeline),
+            "total": percentiles([a + b + c for a, b, c in zip(ready, init, pipeline)])}
+
+
+def check_ollama_unbound() -> None:
+    """RuntimeError if ollama was imported before OLLAMA_HOST pointed to the fake server"""
+    if "ollama" in sys.modules:
+        raise RuntimeError("ollama is already imported, its default client would use the real server")
@@ -0,0 +1,76 @@
+"""In-memory catalog of pipeline configs kept in sync by model signals"""
+
+import time
+import threading
+from typing import Any, Dict, List, Optional
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Config
+
+CONFIG_FIELDS = ("id", "name", "type", "content", "min_replicas", "max_replicas", "executor",
+                 "created_at", "updated_at")
+
+
+class ConfigCatalog:
+    """
+    Config records loaded once and updated on Config save/delete of this process.
+    Changes made by other processes are picked up on reload after KMENGINE_CATALOG_TTL seconds.
+    """
+
+    def __init__(self):
+        self.records: Optional[Dict[int, Dict[str, Any]]] = None  # config_id: record
+        self.loaded_at = 0.0
+        self.lock = threading.Lock()
+
+    def ensure_loaded(self) -> Dict[int, Dict[str, Any]]:
+        """Records, read from DB on first use or when outdated"""
+        ttl = settings.KMENGINE_CATALOG_TTL
+        with self.lock:
+            if self.records is None or (ttl is not None and time.monotonic() - self.loaded_at > ttl):
+                self.records = {r["id"]: r for r in Config.objects.order_by("id").values(*CONFIG_FIELDS)}
+                self.loaded_at = time.monotonic()
+            return self.records
+
+    def all(self) -> List[Dict[str, Any]]:
+        """Copies of all records ordered by id"""
+        return [dict(r) for r in self.ensure_loaded().values()]
+
+    def get(self, config_id: int) -> Optional[Dict[str, Any]]:
+        """Copy of config record or None"""
+        record = self.ensure_loaded().get(config_id)
+        return None if record is None else dict(record)
+
+    def put(self, config: Config) -> None:
+        """Store saved config"""
+        with self.lock:
+            if self.records is not None:
+                # new ids are the largest, so insertion order stays ordered by id
+                self.records[config.id] = {f: getattr(config, f) for f in CONFIG_FIELDS}
+
+    def drop(self, config_id: int) -> None:
+        """Forget deleted config"""
+        with self.lock:
+            if self.records is not None:
+                self.records.pop(config_id, None)
+
+    def invalidate(self) -> None:
+        """Reload on next access"""
+        with self.lock:
+            self.records = None
+
+
+CATALOG = ConfigCatalog()
+
+
+@receiver(post_save, sender=Config, dispatch_uid="kmengine.catalog.put")
+def config_saved(instance: Config, **_kwargs) -> None:
+    """Keep catalog record of saved config"""
+    CATALOG.put(instance)
+
+
+@receiver(post_delete, sender=Config, dispatch_uid="kmengine.catalog.drop")
+def config_deleted(instance: Config, **_kwargs) -> None:
+    """Drop catalog record of deleted config"""
+    CATALOG.drop(instance.id)
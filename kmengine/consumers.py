@@ -1,89 +1,441 @@
 """All magic goes here"""
 
 import re
-import sys
 import json
+import base64
+import time
+import queue
+import atexit
 import asyncio
-import importlib
+import threading
+from functools import partial
 from pathlib import Path
-from typing import Any, Callable, List, Dict
+from typing import Any, Awaitable, Callable, List, Dict, Tuple
 from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from django.conf import settings
 from jupyter_client import MultiKernelManager
 from asgiref.sync import sync_to_async
 
-from utils.string_importer_utils import reload_string_modules
+from utils import profiling
+from utils.registry import REQUIRED_STAGES
+from utils.registry_cache import REGISTRY_CACHE
 from utils.import_getter import get_imports_as_string
 
-from .models import Calculation, Config, Script
+from .models import EXECUTOR_CHOICES, Calculation, Config, RunJob, Script
+from .scheduler import PipelinePool
+from .resources import ResourceSampler, kernel_pid
+from .db import db_read
+from .catalog import CATALOG
+from .framing import JsonFraming, negotiate
+from .dispatch import Dispatcher, config_group, events_group
+from .jobs import JobRunner, enqueue
+
+# display_data of kernel runs with this mime type prefix is run data, not output
+RUN_DATA_MIME = "application/vnd.kme."
+
+# Executed once in every new or restarted kernel
+KERNEL_INIT = ("import nest_asyncio\nimport utils.tqdm_global_config\n"
+               "from utils.fnuser import get_fn, exec_task, exec_batch, load_pipeline, run_request\n"
+               "nest_asyncio.apply()")
 
 
 class KernelCLI:
-    """MultiKernelManager wrapper"""
+    """
+    MultiKernelManager wrapper.
+    One instance per process (see shared()), so warm pipelines survive reconnects.
+    """
+
+    _shared: "KernelCLI | None" = None
 
     def __init__(self):
         self.km = MultiKernelManager()
-        self.pipelines = dict()  # config_id: kernel_id
+        self.pipelines: Dict[int, PipelinePool] = dict()  # config_id: pool of kernels
+        self.clients = 0  # attached websocket connections
+        self.lock = threading.RLock()
+        self.reaper: asyncio.Task | None = None
+        self.watchdog: asyncio.Task | None = None
+        self.generations: Dict[str, int] = dict()  # kernel_id: restarts, running executions give up on change
+        self.heartbeats: Dict[str, Any] = dict()  # kernel_id: client with heartbeat channel only
+        self.missed: Dict[str, int] = dict()  # kernel_id: consecutive heartbeat checks missed
+        self.recovering = set()  # kernel ids being restarted by watchdog
+        self.sampler = ResourceSampler()
+        self.usage: Dict[str, Dict[str, Any]] = dict()  # kernel_id: last resources sample
+        self.kernel_states: Dict[int, Dict[str, str]] = dict()  # config_id: {kernel_id: state}
+        self.on_event: Callable[[Dict[str, Any]], None] | None = None  # state events sink
+
+    @classmethod
+    def shared(cls) -> "KernelCLI":
+        """Process-wide instance, kernels are shut down at interpreter exit"""
+        if cls._shared is None:
+            cls._shared = cls()
+            atexit.register(cls._shared.shutdown_all_kernels)
+        return cls._shared
+
+    def attach(self) -> None:
+        """register client connection, start periodic eviction and kernel watchdog until unused"""
+        self.clients += 1
+        if self.reaper is None or self.reaper.done():
+            self.reaper = asyncio.get_running_loop().create_task(self.reap())
+        if self.watchdog is None or self.watchdog.done():
+            self.watchdog = asyncio.get_running_loop().create_task(self.watch())
+
+    def detach(self) -> None:
+        """unregister client connection, kernels stay until evicted"""
+        self.clients = max(0, self.clients - 1)
+
+    @property
+    def unused(self) -> bool:
+        """No attached clients and no pipelines, eviction and watchdog can stop"""
+        return self.clients == 0 and not self.pipelines
+
+    async def reap(self) -> None:
+        """periodically drop dead, idle and over the limit kernels"""
+        while True:
+            await asyncio.sleep(settings.KMENGINE_EVICT_INTERVAL)
+            try:
+                await sync_to_async(self.update, thread_sensitive=False)()
+            except Exception as e:
+                print(f"Kernel eviction failed: {e}")
+            if self.unused:
+                return  # attach starts it again
+
+    async def watch(self) -> None:
+        """periodically check kernels, restart crashed and hung ones"""
+        while not self.unused:
+            await asyncio.sleep(settings.KMENGINE_KERNEL_WATCH_INTERVAL)
+            try:
+                crashed = await sync_to_async(self.check_kernels, thread_sensitive=False)()
+            except Exception as e:
+                print(f"Kernel watchdog failed: {e}")
+                continue
+            for config_id, kernel_id, reason in crashed:
+                self.recovering.add(kernel_id)
+            results = await asyncio.gather(
+                *(sync_to_async(self.recover, thread_sensitive=False)(config_id, kernel_id, reason)
+                  for config_id, kernel_id, reason in crashed),
+                return_exceptions=True)
+            for (config_id, kernel_id, _), result in zip(crashed, results):
+                if isinstance(result, Exception):
+                    print(f"Kernel {kernel_id} recovery failed: {result}")
+
+    def check_kernels(self) -> List[Tuple[int, str, str]]:
+        """
+        (config_id, kernel_id, reason) of kernels whose process is gone or whose heartbeat
+        was missed KMENGINE_KERNEL_HEARTBEAT_MISSES checks in a row.
+        """
+        crashed = []
+        with self.lock:
+            for pool in list(self.pipelines.values()):
+                for k in list(pool.kernels):
+                    if k not in self.km or k in self.recovering:
+                        continue
+                    km = self.km.get_kernel(k)
+                    if not km.is_alive():
+                        crashed.append((pool.config_id, k, "died"))
+                        continue
+                    client = self.heartbeats.get(k)
+                    if client is None:
+                        client = km.client()
+                        client.start_channels(shell=False, iopub=False, stdin=False, hb=True, control=False)
+                        self.heartbeats[k] = client
+                        continue
+                    if client.hb_channel.is_beating():
+                        self.missed.pop(k, None)
+                        continue
+                    self.missed[k] = self.missed.get(k, 0) + 1
+                    if self.missed[k] >= settings.KMENGINE_KERNEL_HEARTBEAT_MISSES:
+                        crashed.append((pool.config_id, k, "stopped responding"))
+            for k in [k for k in self.heartbeats if k not in self.km]:
+                self.stop_heartbeat(k)
+        return crashed
+
+    def stop_heartbeat(self, kernel_id: str) -> None:
+        """close heartbeat channel of the kernel"""
+        client = self.heartbeats.pop(kernel_id, None)
+        if client is not None:
+            client.stop_channels()
+        self.missed.pop(kernel_id, None)
+
+    def recover(self, config_id: int, kernel_id: str, reason: str) -> None:
+        """
+        Restart crashed kernel (its running executions return 'crashed') and rehydrate it:
+        initial imports and pipeline components are loaded before runs get the kernel again.
+        Kernel that can't be restarted is dropped.
+        """
+        try:
+            with self.lock:
+                pool = self.pipelines.get(config_id)
+                if pool is None or kernel_id not in pool.kernels:
+                    return
+                print(f"Kernel {kernel_id} of pipeline {config_id} {reason}, restarting")
+                pool.hold(kernel_id, "restarting")
+                try:
+                    self.restart_kernel(config_id, kernel_id)
+                except Exception:
+                    pool.release(kernel_id)
+                    self.shutdown_kernel(pool, kernel_id, "dead")
+                    raise
+            try:
+                config = CATALOG.get(config_id)
+                if config is not None:
+                    code = KERNEL_INIT + self.pipeline_code(config["content"])
+                    if self.execute(kernel_id, code, lambda text: None, need_init=False) == "ok":
+                        pool.initialized.add(kernel_id)
+            finally:
+                pool.release(kernel_id)
+        finally:
+            self.recovering.discard(kernel_id)
 
     def update(self) -> List[int]:
         """get updated list of active pipelines"""
-        kernels = set(self.km.list_kernel_ids())
-        bad_pipelines = set()
-        good_pipelines = set()
-        for p, k in self.pipelines.items():
-            if k not in kernels:
-                bad_pipelines.add(p)
-            else:
-                kernels.remove(k)
-                good_pipelines.add(p)
-        for p in bad_pipelines:
-            self.close_pipeline(p)
-        return list(good_pipelines)
+        with self.lock:
+            kernels = set(self.km.list_kernel_ids())
+            for pool in list(self.pipelines.values()):
+                for k in list(pool.kernels):
+                    if k not in kernels:
+                        pool.remove(k, "dead")
+                for k in pool.surplus(settings.KMENGINE_SCALE_DOWN_AFTER):
+                    if pool.reserve_idle(k):
+                        self.shutdown_kernel(pool, k, "stopped")
+            self.usage = {record["kernel_id"]: record for record in self.stats()}
+            self.enforce_memory()
+            self.evict()
+            good_pipelines = []
+            for p, pool in list(self.pipelines.items()):
+                if pool.kernels:
+                    good_pipelines.append(p)
+                elif not pool.busy:
+                    del self.pipelines[p]
+            return good_pipelines
+
+    def evict(self) -> List[int]:
+        """
+        Shut down idle kernels unused for KMENGINE_IDLE_TIMEOUT seconds
+        and least recently used ones while live kernels exceed KMENGINE_MAX_KERNELS
+        or their memory (last sampled) exceeds KMENGINE_TOTAL_MEMORY_LIMIT megabytes.
+        Returns config ids of evicted kernels.
+        """
+        with self.lock:
+            now = time.monotonic()
+            idle = [(pool.last_used.get(k, now), pool, k)
+                    for pool in self.pipelines.values()
+                    for k, n in list(pool.kernels.items()) if n == 0]
+            idle.sort(key=lambda item: item[0])
+            live = sum(len(pool.kernels) + pool.starting for pool in self.pipelines.values())
+            memory_limit = settings.KMENGINE_TOTAL_MEMORY_LIMIT
+            memory = sum(record["rss_mb"] for record in self.usage.values())
+            evicted = []
+            for last_used, pool, k in idle:
+                if (now - last_used < settings.KMENGINE_IDLE_TIMEOUT and
+                        live <= settings.KMENGINE_MAX_KERNELS and
+                        (memory_limit is None or memory <= memory_limit)):
+                    break
+                if not pool.reserve_idle(k):
+                    continue  # taken by a run meanwhile
+                if k in self.usage:
+                    memory -= self.usage[k]["rss_mb"]
+                self.shutdown_kernel(pool, k, "evicted")
+                live -= 1
+                evicted.append(pool.config_id)
+            return evicted
+
+    def enforce_memory(self) -> List[str]:
+        """
+        Restart idle kernels using more than KMENGINE_KERNEL_MEMORY_LIMIT megabytes,
+        busy ones are checked again after their run. Returns restarted kernel ids.
+        """
+        limit = settings.KMENGINE_KERNEL_MEMORY_LIMIT
+        if limit is None:
+            return []
+        restarted = []
+        with self.lock:
+            for pool in list(self.pipelines.values()):
+                for k, n in list(pool.kernels.items()):
+                    record = self.usage.get(k)
+                    if n or record is None or record["rss_mb"] <= limit or not pool.reserve_idle(k):
+                        continue
+                    print(f"Kernel {k} of pipeline {pool.config_id} uses {record['rss_mb']} MB, restarting")
+                    try:
+                        self.restart_kernel(pool.config_id, k)
+                    finally:
+                        pool.release(k)
+                    restarted.append(k)
+        return restarted
+
+    def restart_kernel(self, config_id: int, kernel_id: str) -> None:
+        """restart kernel of the pipeline, its state is lost"""
+        with self.lock:
+            self.generations[kernel_id] = self.generations.get(kernel_id, 0) + 1
+            self.stop_heartbeat(kernel_id)
+            record = self.usage.pop(kernel_id, None)
+            if record is not None:
+                self.sampler.forget(record["pid"])
+            if kernel_id in self.km:
+                self.km.restart_kernel(kernel_id, now=True)
+            if config_id in self.pipelines:
+                self.pipelines[config_id].initialized.discard(kernel_id)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """CPU and memory of every pipeline kernel"""
+        ret = []
+        for pool in list(self.pipelines.values()):
+            for k, n in list(pool.kernels.items()):
+                if k not in self.km:
+                    continue
+                record = self.sampler.sample(kernel_pid(self.km.get_kernel(k)))
+                if record is None:
+                    continue
+                record.update({"config_id": pool.config_id, "kernel_id": k, "running": n})
+                ret.append(record)
+        return ret
 
-    def close_pipeline(self, config_id: int) -> str:
-        """stop pipeline and it's ipython kernel"""
-        if config_id not in self.pipelines:
-            return f"No pipeline {config_id} running\n"
-        kernel_id = self.pipelines[config_id]
+    def shutdown_kernel(self, pool: PipelinePool, kernel_id: str, state: str = "stopped") -> None:
+        """stop one kernel of the pipeline, state is reported as the reason"""
+        self.stop_heartbeat(kernel_id)
         if kernel_id in self.km:
+            self.sampler.forget(kernel_pid(self.km.get_kernel(kernel_id)))
             self.km.shutdown_kernel(kernel_id, now=True)
-        del self.pipelines[config_id]
-        return f"Pipeline {config_id} closed\n"
+        self.usage.pop(kernel_id, None)
+        self.generations.pop(kernel_id, None)
+        pool.remove(kernel_id, state)
+
+    def kernel_event(self, config_id: int, kernel_id: str | None, state: str) -> None:
+        """Track kernel state reported by pipeline pool and pass it to on_event"""
+        if self.on_event is not None:
+            self.on_event({"kind": "kernel", "config_id": config_id,
+                           "kernel_id": kernel_id, "state": state})
+        if kernel_id is None:
+            return
+        with self.lock:
+            states = self.kernel_states.setdefault(config_id, dict())
+            if state in ("idle", "busy", "restarting"):
+                states[kernel_id] = state
+            else:
+                states.pop(kernel_id, None)
+                if not states:
+                    del self.kernel_states[config_id]
+
+    def active_pipelines(self) -> List[int]:
+        """Pipelines with live kernels, as tracked by kernel events"""
+        return list(self.kernel_states)
+
+    def close_pipeline(self, config_id: int) -> str:
+        """stop pipeline and it's ipython kernels"""
+        with self.lock:
+            if config_id not in self.pipelines:
+                return f"No pipeline {config_id} running\n"
+            pool = self.pipelines[config_id]
+            for kernel_id in list(pool.kernels):
+                self.shutdown_kernel(pool, kernel_id)
+            if not pool.busy:
+                del self.pipelines[config_id]
+            return f"Pipeline {config_id} closed\n"
+
+    def pool(self, config_id: int, min_replicas: int = 1, max_replicas: int = 1) -> PipelinePool:
+        """Get or create pool of the pipeline with given replicas bounds"""
+        with self.lock:
+            pool = self.pipelines.get(config_id)
+            if pool is None:
+                pool = PipelinePool(config_id, min_replicas, max_replicas)
+                pool.listener = self.kernel_event
+                self.pipelines[config_id] = pool
+            else:
+                pool.resize(min_replicas, max_replicas)
+            return pool
+
+    async def start_kernel(self) -> str:
+        """start new ipython kernel without blocking event loop, kernel of cancelled start is shut down"""
+        loop = asyncio.get_running_loop()
+        # make room for the new kernel among least recently used ones
+        await loop.run_in_executor(None, self.evict)
+        started = loop.run_in_executor(None, partial(self.km.start_kernel, kernel_name="python3"))
+        try:
+            return await asyncio.shield(started)
+        except asyncio.CancelledError:
+            # the kernel is in no pool yet, nothing else would stop it
+            started.add_done_callback(self.shutdown_started)
+            raise
+
+    def shutdown_started(self, started: asyncio.Future) -> None:
+        """shut down kernel whose start was cancelled once it has started"""
+        if started.cancelled() or started.exception() is not None:
+            return
+        started.get_loop().run_in_executor(None, partial(self.km.shutdown_kernel, started.result(), now=True))
 
-    def ensure_pipeline(self, config_id: int) -> str:
+    async def acquire_kernel(self, config: Config,
+                             on_queued: Callable[[int, float | None], Awaitable[None]]) -> Tuple[str, bool]:
         """
-        Ensure a pipeline exists for the given config_id.
-        If not, start a new kernel and register it immediately.
-        Returns the kernel_id.
+        Get kernel of the pipeline for a run: idle one, new replica or after waiting in queue.
+        Returns the kernel_id and need_init flag.
         """
-        if config_id not in self.pipelines:
-            kernel_id = self.km.start_kernel(kernel_name="python3")
-            self.pipelines[config_id] = kernel_id
-            return kernel_id, True
-        else:
-            return self.pipelines[config_id], False
+        with self.lock:
+            # busy from now on, update drops only pools that are not (under the same lock)
+            pool = self.pool(config.id, config.min_replicas, config.max_replicas)
+            with pool.lock:
+                pool.acquiring += 1
+        try:
+            return await pool.acquire(self.start_kernel, on_queued)
+        finally:
+            with pool.lock:
+                pool.acquiring -= 1
+
+    def release_kernel(self, config_id: int, kernel_id: str, duration: float | None = None) -> None:
+        """Return kernel to the pipeline pool after a run"""
+        if config_id in self.pipelines:
+            self.pipelines[config_id].release(kernel_id, duration)
 
     def run_pipeline_kernel(self, kernel_id: str, content_: str, indexer: str, path_or_query: str,
-                            on_output: Callable[[str], None], need_init: bool) -> str:
+                            on_output: Callable[[str], None], need_init: bool,
+                            stop: threading.Event | None = None,
+                            on_data: Callable[[str, Any], None] | None = None, profile: bool = False) -> str:
         """
         Run pipeline code in the given kernel.
         """
-        if indexer == "true":
-            larg = f"path='{path_or_query}'"
-            indexer = "True"
-        else:
-            larg = f"query='{path_or_query}'"
-            indexer = "False"
-        code = f"""
-code = {content_}
-fn_dict = {{k: (get_fn(v['path']), v['settings']) for k, v in code.items()}}
-await exec_task(fn_dict, {indexer}, {larg})
-"""
+        request = {"content": content_, "kind": "run",
+                   "indexer": indexer == "true", "path_or_query": path_or_query, "profile": profile}
+        return self.execute(kernel_id, self.request_code(request), on_output, need_init, stop, on_data)
+
+    def run_batch_kernel(self, kernel_id: str, content_: str, queries: List[str], concurrency: int,
+                         on_output: Callable[[str], None], need_init: bool,
+                         stop: threading.Event | None = None,
+                         on_data: Callable[[str, Any], None] | None = None, profile: bool = False) -> str:
+        """
+        Run batch of queries in the given kernel within one execution.
+        """
+        request = {"content": content_, "kind": "run_batch",
+                   "queries": queries, "concurrency": int(concurrency), "profile": profile}
+        return self.execute(kernel_id, self.request_code(request), on_output, need_init, stop, on_data)
+
+    @staticmethod
+    def request_code(request: Dict[str, Any]) -> str:
+        """
+        Kernel code running the request, arguments are passed as one json string literal
+        and the pipeline is built once per config by utils.fnuser.load_pipeline.
+        """
+        return f"\nawait run_request({json.dumps(request, ensure_ascii=False)!r})\n"
+
+    @staticmethod
+    def pipeline_code(content_: str) -> str:
+        """Kernel code loading pipeline components"""
+        return f"\nfn_dict = load_pipeline({content_!r})\n"
+
+    def execute(self, kernel_id: str, code: str, on_output: Callable[[str], None], need_init: bool,
+                stop: threading.Event | None = None,
+                on_data: Callable[[str, Any], None] | None = None) -> str:
+        """
+        Execute code in the given kernel, call on_output with each output chunk
+        and on_data(mime, value) with run data published as display_data
+        (spans of utils.tracing, profile of utils.profiling).
+        Setting stop makes it give up waiting for the kernel (e.g. it was restarted).
+        Returns 'crashed' if kernel died or was restarted by watchdog meanwhile.
+        """
         # For new kernels, we need to do initial imports
         if need_init:
-            code = "import nest_asyncio\nimport utils.tqdm_global_config\nfrom utils.fnuser import get_fn, exec_task\nnest_asyncio.apply()" + code
+            code = KERNEL_INIT + code
             on_output("Done some initial imports.\n")
 
         ret = "ok"
+        generation = self.generations.get(kernel_id, 0)
         km = self.km.get_kernel(kernel_id)
         client = km.client()
         client.start_channels()
@@ -91,7 +443,18 @@ await exec_task(fn_dict, {indexer}, {larg})
 
         msg_id = client.execute(code)
         while True:
-            msg = client.get_iopub_msg(timeout=-1)
+            try:
+                msg = client.get_iopub_msg(timeout=1)
+            except queue.Empty:
+                if stop is not None and stop.is_set():
+                    ret = "fail"
+                    on_output("❌ Execution aborted\n")
+                    break
+                if self.generations.get(kernel_id, 0) != generation or not km.is_alive():
+                    ret = "crashed"
+                    on_output("💥 Kernel crashed, it is restarted for next runs\n")
+                    break
+                continue
             if msg["parent_header"].get("msg_id") == msg_id:
                 msg_type = msg["msg_type"]
                 content = msg["content"]
@@ -106,6 +469,10 @@ await exec_task(fn_dict, {indexer}, {larg})
                         on_output("\r" + last_line)
                     else:
                         on_output(text)
+                elif msg_type == "display_data":
+                    for mime, value in content["data"].items():
+                        if mime.startswith(RUN_DATA_MIME) and on_data is not None:
+                            on_data(mime, value)
                 elif msg_type == "error":
                     ret = "fail"
                     err = "❌ Error:\n" + "\n".join(content["traceback"]) + "\n"
@@ -116,6 +483,27 @@ await exec_task(fn_dict, {indexer}, {larg})
         client.stop_channels()
         return ret
 
+    @staticmethod
+    def load_queries(source: str) -> List[str]:
+        """
+        Queries for batch run: json list of strings or path to a file
+        (.json with list of strings or plain text with one query per line).
+        """
+        try:
+            queries = json.loads(source)
+        except json.JSONDecodeError:
+            file = Path(source)
+            if not file.is_file():
+                raise ValueError(f"'{source}' is neither json list nor file") from None
+            text = file.read_text(encoding="utf-8")
+            if file.suffix == ".json":
+                queries = json.loads(text)
+            else:
+                queries = [line.strip() for line in text.splitlines() if line.strip()]
+        if not isinstance(queries, list) or not all(isinstance(q, str) for q in queries):
+            raise ValueError("Queries must be a list of strings")
+        return queries
+
     # def run_pipeline(self, config_id: int, content_: str, indexer: str,
     #                  path_or_query: str, on_output: Callable[[str], None]) -> str:
     #     """
@@ -127,18 +515,38 @@ await exec_task(fn_dict, {indexer}, {larg})
 
     def shutdown_all_kernels(self) -> None:
         """stop all ipython kernels"""
-        self.pipelines = dict()
-        for kernel_id in self.km.list_kernel_ids():
-            self.km.shutdown_kernel(kernel_id, now=True)
+        with self.lock:
+            for config_id in list(self.pipelines):
+                self.close_pipeline(config_id)
+            for kernel_id in self.km.list_kernel_ids():
+                self.km.shutdown_kernel(kernel_id, now=True)
 
-    def list_configs(self) -> List[Dict[str, Any]]:
-        """Return a list of all configs as dicts"""
-        ret = list(Config.objects.all().values("id", "name", "type", "created_at", "updated_at"))
-        active = self.update()
-        for record in ret:
-            record["created_at"] = f"{record["created_at"]: %H:%M:%S %d/%m/%Y}"
-            record["updated_at"] = f"{record["updated_at"]: %H:%M:%S %d/%m/%Y}"
-            record["active"] = record["id"] in active
+    def list_configs(self, owners: Dict[int, str] | None = None) -> List[Dict[str, Any]]:
+        """
+        Return a list of all configs as dicts, from config catalog and tracked kernel states.
+        owners: config_id: worker of pipelines owned by other processes
+        """
+        active = self.kernel_states
+        owners = owners or dict()
+        # kernels are restarted, shut down and sampled by other threads meanwhile
+        pools = {config_id: pool.info() for config_id, pool in list(self.pipelines.items())}
+        usages = list(self.usage.values())
+        ret = []
+        for config in CATALOG.all():
+            record = {key: config[key] for key in ("id", "name", "type", "executor")}
+            record["created_at"] = f"{config["created_at"]: %H:%M:%S %d/%m/%Y}"
+            record["updated_at"] = f"{config["updated_at"]: %H:%M:%S %d/%m/%Y}"
+            ret.append(record)
+            record["active"] = record["id"] in active or record["id"] in owners
+            if record["id"] in owners:
+                record["worker"] = owners[record["id"]]
+            if record["id"] in pools:
+                record["pool"] = pools[record["id"]]
+                usage = [u for u in usages if u["config_id"] == record["id"]]
+                record["resources"] = {
+                    "rss_mb": round(sum(u["rss_mb"] for u in usage), 1),
+                    "cpu_percent": round(sum(u["cpu_percent"] or 0.0 for u in usage), 1),
+                }
         return ret
 
     def delete_config(self, config_id: int) -> str:
@@ -151,21 +559,20 @@ await exec_task(fn_dict, {indexer}, {larg})
         except Config.DoesNotExist:
             return f"Config {config_id} does not exist"
 
-    def get_config(self, config_id: int) -> Dict[str, Any]:
+    def get_config(self, config_id: int, owners: Dict[int, str] | None = None) -> Dict[str, Any]:
         """Get a config by id"""
-        try:
-            config = Config.objects.get(id=config_id)
-            return {
-                "id": config.id,
-                "name": config.name,
-                # "type": config.type,
-                "content": config.content,
-                # "created_at": str(config.created_at),
-                # "updated_at": str(config.updated_at),
-                "active": config.id in self.update()
-            }
-        except Config.DoesNotExist:
+        config = CATALOG.get(config_id)
+        if config is None:
             return {}
+        return {
+            "id": config["id"],
+            "name": config["name"],
+            # "type": config["type"],
+            "content": config["content"],
+            # "created_at": str(config["created_at"]),
+            # "updated_at": str(config["updated_at"]),
+            "active": config_id in self.kernel_states or config_id in (owners or dict())
+        }
 
     @staticmethod
     def update_config(config_id: int, new_name: str, new_content: str) -> str:
@@ -179,20 +586,60 @@ await exec_task(fn_dict, {indexer}, {larg})
         except Config.DoesNotExist:
             return f"Config {config_id} does not exist"
 
+    def scale_config(self, config_id: int, min_replicas: int, max_replicas: int) -> str:
+        """Set pipeline replicas bounds by config id"""
+        try:
+            config = Config.objects.get(id=config_id)
+        except Config.DoesNotExist:
+            return f"Config {config_id} does not exist"
+        max_replicas = max(1, max_replicas)
+        config.min_replicas = min(max(0, min_replicas), max_replicas)
+        config.max_replicas = max_replicas
+        config.save()
+        if config_id in self.pipelines:
+            self.pipelines[config_id].resize(config.min_replicas, config.max_replicas)
+        return f"Config {config_id} scaled to {config.min_replicas}..{config.max_replicas} replicas"
+
+    def set_executor(self, config_id: int, executor: str) -> str:
+        """Run pipeline in kernels ('kernel') or in process ('inprocess', trusted pipelines only)"""
+        if executor not in dict(EXECUTOR_CHOICES):
+            return f"Unknown executor '{executor}', expected one of: {', '.join(dict(EXECUTOR_CHOICES))}"
+        try:
+            config = Config.objects.get(id=config_id)
+        except Config.DoesNotExist:
+            return f"Config {config_id} does not exist"
+        config.executor = executor
+        config.save()
+        if executor == "inprocess":
+            self.close_pipeline(config_id)
+        return f"Config {config_id} runs with {executor} executor"
+
     def help(self) -> str:
         """show avaible commands"""
         return """
 Available commands:
   config <name> <type> <json>          Create pipeline configuration from json
   update                               Get updated list of active pipelines
-  run <id> <indexer> <arg>             Run pipeline with given configuration id
+  run <id> <indexer> <arg> [<timeout>] [profile]
+                                       Run pipeline with given configuration id, optionally profiled
+  run_batch <id> <queries> [<conc>] [<timeout>] [profile]
+                                       Run json list or file of queries in one execution
+  profile <calculation_id> [<n>] [raw] Top n functions of profiled run, raw adds .prof as base64
+  cancel <calculation_id>              Interrupt running calculation, kernel stays warm
+  cancel_job <job_id>                  Remove queued run from the queue
   close <id>                           Close pipeline with given configuration id
+  scale <id> <min> <max>               Set min/max kernel replicas of the pipeline
+  executor <id> <kernel|inprocess>     Run pipeline in kernels or in process (trusted only)
   delete_config <id>                   Delete a pipeline configuration by id
   list_configs                         List all pipeline configurations
+  stats                                CPU and memory usage of pipeline kernels
   get_config <id>                      Get a pipeline configuration by id
   config_creation_info                 Get registry and default config
   update_config <id> <name> <content>  Update configuration's name and content by id
-  exit                                 Exit the CLI (kernels will be shut down)
+  list_jobs                            List queued and running jobs
+  subscribe [<id> ...]                 Receive kernel and calculation events (all or given pipelines)
+  unsubscribe [<id> ...]               Stop receiving events (all subscriptions or given pipelines)
+  exit                                 Exit the CLI (pipelines stay warm until evicted)
 """
 
 
@@ -201,17 +648,24 @@ class KMEConsumer(AsyncJsonWebsocketConsumer):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        # Do NOT call self.reload_registry() here!
-        self.regm = None
+        # Do NOT call self.update_registry() here!
         self.registry = None
-        self.cli: KernelCLI = KernelCLI()
+        self.cli: KernelCLI = KernelCLI.shared()
+        self.dispatcher: Dispatcher = Dispatcher.shared(self.cli)
+        self.followed = set()  # pipeline and state events groups
+        self.framing: JsonFraming = JsonFraming()  # negotiated on connect
         self.command_handlers: Dict[str, Callable[[List[Any]], None]] = {
             "update": self.handle_update,
             "close": self.handle_close,
+            "scale": self.handle_scale,
+            "executor": self.handle_executor,
             "run": self.handle_run,
+            "run_batch": self.handle_run_batch,
+            "profile": self.handle_profile,
             "config": self.handle_config,
             "delete_config": self.handle_delete_config,
             "list_configs": self.handle_list_configs,
+            "stats": self.handle_stats,
             "get_config": self.handle_get_config,
             "config_creation_info": self.handle_config_creation_info,
             "update_config": self.handle_update_config,
@@ -221,69 +675,74 @@ class KMEConsumer(AsyncJsonWebsocketConsumer):
             "get_script": self.handle_get_script,
             "delete_script": self.handle_delete_script,
             "list_calculations": self.handle_list_calculations,
+            "list_jobs": self.handle_list_jobs,
+            "cancel": self.handle_cancel,
+            "cancel_job": self.handle_cancel_job,
+            "subscribe": self.handle_subscribe,
+            "unsubscribe": self.handle_unsubscribe,
         }
         # Set of commands that are long-running and should be dispatched in background
-        self.long_running_commands = {"run"}
+        # run and run_batch only queue the run and reply with job_id or error
+        self.long_running_commands = set()
 
     def gen_default(self):
         """Generate default config from first options in registry"""
         return {
-            k: {"path": next(iter(self.registry[k]))} for k in self.registry if k != "hidden"
+            k: {"path": next(iter(self.registry[k]))} for k in REQUIRED_STAGES
         } # , "settings": dict()
 
-    def reload_registry(self):
-        """
-        Reload dynamic module with imports from all Script paths in the DB.
-        Also, after importing REGISTRY, set a 'hidden' key in the in_memory_module
-        with the list of hidden script paths.
-        """
-        # Retrieve all script paths, both visible and hidden
-        all_scripts = list(Script.objects.all().values("path", "hidden"))
-        visible_paths = [s["path"] for s in all_scripts if not s["hidden"]]
-        hidden_paths = [s["path"] for s in all_scripts if s["hidden"]]
-
-        # Generate import statements for all script paths (visible and hidden)
-        import_lines = "\n".join([f"import {s['path']}" for s in all_scripts])
-        # Always import REGISTRY as before
-        import_lines += "\nfrom utils.registry import REGISTRY\n"
-
-        # Compose the code to also set the hidden list after REGISTRY import
-        import_lines += f"\nREGISTRY['hidden'] = {hidden_paths!r}\n"
-
-        # Remove all relevant modules from sys.modules to force re-import
-        for script in all_scripts:
-            module_name = script["path"]
-            if module_name in sys.modules:
-                del sys.modules[module_name]
-        if 'utils.registry' in sys.modules:
-            del sys.modules['utils.registry']
-
-        # Call reload_string_modules with the generated import string
-        reload_string_modules({"in_memory_module": import_lines})
+    def valid_paths(self, content_json: Dict[str, Any]) -> bool:
+        """All required stages present, every node path is registered in its stage category"""
+        if any(stage not in content_json for stage in REQUIRED_STAGES):
+            return False
+        for stage, specs in content_json.items():
+            if stage not in self.registry or stage == "hidden":
+                return False
+            specs = specs if isinstance(specs, list) and stage == "retriever" else [specs]
+            if not specs or any(spec.get("path") not in self.registry[stage] for spec in specs):
+                return False
+        return True
 
     def update_registry(self):
-        """Update dict of options"""
-        self.reload_registry()
-        # if 'in_memory_module' in sys.modules:
-        #     del sys.modules['in_memory_module']
-        self.regm = importlib.__import__('in_memory_module', fromlist=['REGISTRY'])
-        self.registry = self.regm.REGISTRY
-        # print(self.registry)
+        """Update dict of options, only changed scripts are rescanned"""
+        scripts = list(Script.objects.all().values("path", "hidden"))
+        self.registry = REGISTRY_CACHE.refresh(scripts)
 
     async def connect(self) -> None:
         """for client on client connect"""
         # Safely reload registry with DB access
-        # await sync_to_async(self.reload_registry)()
-        # self.regm = importlib.__import__('in_memory_module', fromlist=['REGISTRY'])
-        # self.registry = self.regm.REGISTRY
         await sync_to_async(self.update_registry)()
-        await self.accept()
+        self.cli.attach()
+        await self.dispatcher.start()
+        if settings.KMENGINE_EXECUTION == "local":
+            # no ASGI startup hook under daphne: queued and lost jobs resume on first connection
+            JobRunner.shared(self.dispatcher).start()
+        self.framing = negotiate(self.scope.get("subprotocols", []), settings.KMENGINE_WS_DEFLATE_MIN)
+        await self.accept(subprotocol=self.framing.name)
         await self.send_json({"status": "connected",
                               "output": self.cli.help()})
 
     async def disconnect(self, _: Any = None) -> None:
-        """for client on client disconnect"""
-        self.cli.shutdown_all_kernels()
+        """for client on client disconnect, kernels are shared and stay warm"""
+        self.cli.detach()
+        for group in self.followed:
+            await self.channel_layer.group_discard(group, self.channel_name)
+        self.followed = set()
+
+    async def receive(self, text_data: str | None = None, bytes_data: bytes | None = None, **kwargs) -> None:
+        """decode frame with negotiated framing"""
+        try:
+            content = self.framing.decode(text_data, bytes_data)
+        except Exception as e:
+            await self.send_json({"status": "error",
+                                  "message": f"Bad frame: {e}"})
+            return
+        await self.receive_json(content, **kwargs)
+
+    async def send_json(self, content: Any, close: bool = False) -> None:
+        """encode message with negotiated framing"""
+        text_data, bytes_data = self.framing.encode(content)
+        await self.send(text_data=text_data, bytes_data=bytes_data, close=close)
 
     async def receive_json(self, content: Any = None, **kwargs) -> None:
         """do job from json"""
@@ -315,7 +774,8 @@ class KMEConsumer(AsyncJsonWebsocketConsumer):
 
     async def handle_update(self, args: List[Any]) -> None:
         """KernelCLI update wrapper"""
-        kernels = self.cli.update()
+        # samples kernels and may restart or shut them down, keep the event loop free
+        kernels = await sync_to_async(self.cli.update, thread_sensitive=False)()
         await self.send_json({"status": "ok",
                               "pipelines": kernels})
 
@@ -323,7 +783,7 @@ class KMEConsumer(AsyncJsonWebsocketConsumer):
         """KernelCLI close_pipeline wrapper"""
         config_id = int(args[0]) if args else None
         if config_id:
-            msg = self.cli.close_pipeline(config_id)
+            msg = await self.dispatcher.close(config_id)
             await self.send_json({"status": "ok",
                                   "closed_id": config_id,
                                   "message": msg})
@@ -331,57 +791,196 @@ class KMEConsumer(AsyncJsonWebsocketConsumer):
             await self.send_json({"status": "error",
                                   "message": "No config_id provided"})
 
-    async def handle_run(self, args: List[Any]) -> None:
-        """KernelCLI run_pipeline wrapper with immediate pipeline registration and output storage"""
+    async def handle_scale(self, args: List[Any]) -> None:
+        """KernelCLI scale_config wrapper"""
         if len(args) < 3:
             await self.send_json({"status": "error",
-                                  "message": "config_id, indexer and path_or_query required"})
+                                  "message": "Arguments required: id, min_replicas, max_replicas"})
             return
-        config_id, indexer, path_or_query = int(args[0]), args[1], args[2]
-        config = await sync_to_async(Config.objects.get)(id=config_id)
-        content_ = config.content
-        calculation = await sync_to_async(Calculation.objects.create)(
-            status='running',
-            config_id=config_id,
-            input=str(args)
-        )
-        loop = asyncio.get_running_loop()
+        config_id, min_replicas, max_replicas = int(args[0]), int(args[1]), int(args[2])
+        msg = await sync_to_async(self.cli.scale_config)(config_id, min_replicas, max_replicas)
+        await self.send_json({"status": "ok",
+                              "scaled_id": config_id,
+                              "message": msg})
 
-        # Ensure pipeline and get kernel_id immediately in main thread
-        kernel_id, need_init = await sync_to_async(self.cli.ensure_pipeline)(config_id)
+    async def handle_executor(self, args: List[Any]) -> None:
+        """KernelCLI set_executor wrapper"""
+        if len(args) < 2:
+            await self.send_json({"status": "error",
+                                  "message": "Arguments required: id, executor"})
+            return
+        config_id = int(args[0])
+        msg = await sync_to_async(self.cli.set_executor)(config_id, args[1])
+        await self.send_json({"status": "ok",
+                              "config_id": config_id,
+                              "message": msg})
 
-        output_accumulator = []
+    async def handle_run(self, args: List[Any]) -> None:
+        """Dispatch pipeline run, output comes through pipeline group"""
+        if len(args) < 3:
+            await self.send_json({"status": "error",
+                                  "message": "config_id, indexer and path_or_query required"})
+            return
+        try:
+            config_id, indexer, path_or_query = int(args[0]), args[1], args[2]
+            timeout, profile = self.run_options(args[3:])
+        except ValueError as e:
+            await self.send_json({"status": "error",
+                                  "message": f"Bad run arguments: {e}"})
+            return
+        await self.submit(config_id, {"kind": "run",
+                                      "indexer": indexer,
+                                      "path_or_query": path_or_query,
+                                      "timeout": timeout,
+                                      "profile": profile,
+                                      "input": str(args)})
+
+    async def handle_run_batch(self, args: List[Any]) -> None:
+        """Dispatch batch run, all queries go to one Calculation"""
+        if len(args) < 2:
+            await self.send_json({"status": "error",
+                                  "message": "config_id and queries required"})
+            return
+        try:
+            config_id = int(args[0])
+            concurrency = int(args[2]) if len(args) > 2 else 4
+            timeout, profile = self.run_options(args[3:])
+            queries = await sync_to_async(self.cli.load_queries)(args[1])
+        except ValueError as e:
+            await self.send_json({"status": "error",
+                                  "message": str(e)})
+            return
+        await self.submit(config_id, {"kind": "run_batch",
+                                      "queries": queries,
+                                      "concurrency": concurrency,
+                                      "timeout": timeout,
+                                      "profile": profile,
+                                      "input": json.dumps(queries, ensure_ascii=False)})
 
-        async def send_output(text):
-            await self.send_json({"status": "output",
-                                  "from": [config_id, calculation.id],
-                                  "output": text})
+    @staticmethod
+    def run_options(options: List[Any]) -> Tuple[float | None, bool]:
+        """Timeout and profile flag from trailing run arguments: [<timeout>] [profile]"""
+        timeout, profile = None, False
+        for option in options:
+            if option == "profile":
+                profile = True
+            elif option not in (None, ""):
+                timeout = float(option)
+        return timeout, profile
+
+    async def handle_profile(self, args: List[Any]) -> None:
+        """Top functions of profiled calculation, 'raw' adds the .prof artifact as base64"""
+        if not args:
+            await self.send_json({"status": "error",
+                                  "message": "No calculation_id provided"})
+            return
+        calculation_id = int(args[0])
+        limit = int(args[1]) if len(args) > 1 and str(args[1]).isdigit() else 20
+        artifact = await db_read(Calculation.objects.filter(id=calculation_id)
+                                 .values_list("profile", flat=True).first)()
+        if not artifact:
+            await self.send_json({"status": "error",
+                                  "message": f"Calculation {calculation_id} has no profile"})
+            return
+        artifact = bytes(artifact)
+        reply = {"status": "ok",
+                 "calculation_id": calculation_id,
+                 "profile": profiling.summary(profiling.loads(artifact), limit)}
+        if "raw" in args:
+            reply["artifact"] = base64.b64encode(artifact).decode("ascii")
+        await self.send_json(reply)
+
+    async def submit(self, config_id: int, request: Dict[str, Any]) -> None:
+        """Follow pipeline group and put request into the run queue"""
+        if await db_read(CATALOG.get)(config_id) is None:
+            await self.send_json({"status": "error",
+                                  "message": f"No config {config_id}"})
+            return
+        group = config_group(config_id)
+        if group not in self.followed:
+            await self.channel_layer.group_add(group, self.channel_name)
+            self.followed.add(group)
+        job = await sync_to_async(enqueue)(config_id, request)
+        await self.dispatcher.notify()
+        await self.send_json({"status": "ok",
+                              "config_id": config_id,
+                              "job_id": job.id,
+                              "priority": job.priority,
+                              "message": "Run queued"})
 
-        def on_output(text):
-            output_accumulator.append(text)
-            asyncio.run_coroutine_threadsafe(send_output(text), loop)
+    async def handle_cancel(self, args: List[Any]) -> None:
+        """Interrupt running calculation, pipeline kernel stays alive"""
+        if not args:
+            await self.send_json({"status": "error",
+                                  "message": "No calculation_id provided"})
+            return
+        calculation_id = int(args[0])
+        msg = await self.dispatcher.cancel(calculation_id)
+        await self.send_json({"status": "ok",
+                              "calculation_id": calculation_id,
+                              "message": msg})
 
-        # Now run the code in the already-registered kernel
-        status = await loop.run_in_executor(
-            None,
-            self.cli.run_pipeline_kernel,
-            kernel_id,
-            content_, indexer, path_or_query,
-            on_output,
-            need_init
+    async def handle_cancel_job(self, args: List[Any]) -> None:
+        """Remove job from the queue if it has not started yet"""
+        if not args:
+            await self.send_json({"status": "error",
+                                  "message": "No job_id provided"})
+            return
+        job_id = int(args[0])
+        cancelled = await sync_to_async(RunJob.objects.filter(id=job_id, status="queued").update)(
+            status="cancelled")
+        if cancelled:
+            await self.send_json({"status": "ok",
+                                  "job_id": job_id,
+                                  "message": f"Job {job_id} cancelled"})
+        else:
+            await self.send_json({"status": "error",
+                                  "message": f"Job {job_id} is not queued"})
+
+    async def handle_list_jobs(self, args: List[Any]) -> None:
+        """Queued and running jobs in execution order"""
+        jobs = await db_read(list)(
+            RunJob.objects.filter(status__in=["queued", "running"])
+            .order_by("-status", "-priority", "id")
+            .values("id", "config_id", "calculation_id", "priority", "status", "worker", "created_at")
         )
+        for record in jobs:
+            record["created_at"] = f"{record["created_at"]: %H:%M:%S %d/%m/%Y}"
+        await self.send_json({"status": "ok",
+                              "jobs": jobs})
+
+    async def handle_subscribe(self, args: List[Any]) -> None:
+        """Join state events groups, reply with current kernel states of this process"""
+        groups = [events_group(int(a)) for a in args] or [events_group()]
+        for group in groups:
+            if group not in self.followed:
+                await self.channel_layer.group_add(group, self.channel_name)
+                self.followed.add(group)
+        await self.send_json({"status": "ok",
+                              "subscribed": sorted(g for g in self.followed if g.startswith(events_group())),
+                              "kernels": {config_id: dict(states)
+                                          for config_id, states in list(self.cli.kernel_states.items())}})
+
+    async def handle_unsubscribe(self, args: List[Any]) -> None:
+        """Leave given state events groups or all of them"""
+        if args:
+            groups = [events_group(int(a)) for a in args]
+        else:
+            groups = [g for g in self.followed if g.startswith(events_group())]
+        for group in groups:
+            if group in self.followed:
+                await self.channel_layer.group_discard(group, self.channel_name)
+                self.followed.discard(group)
+        await self.send_json({"status": "ok",
+                              "subscribed": sorted(g for g in self.followed if g.startswith(events_group()))})
 
-        # Store the accumulated output in the Calculation.output field
-        full_output = "".join(output_accumulator)
-        await sync_to_async(Calculation.objects.filter(id=calculation.id).update)(
-            output=full_output,
-            status=status
-        )
+    async def kme_event(self, event: Dict[str, Any]) -> None:
+        """State events group message"""
+        await self.send_json(event["payload"])
 
-        # await self.update_calculation_status(calculation.id, status)
-        await self.send_json({"status": "ok",
-                              "from": [config_id, calculation.id],
-                              "message": "Execution finished"})
+    async def kme_output(self, event: Dict[str, Any]) -> None:
+        """Pipeline group message"""
+        await self.send_json(event["payload"])
 
     async def handle_config(self, args: List[Any]) -> None:
         """KernelCLI config wrapper"""
@@ -391,10 +990,7 @@ class KMEConsumer(AsyncJsonWebsocketConsumer):
             return
         name, type_, content_ = args[0], args[1], args[2]
         content_json = json.loads(content_)
-        if (content_json["indexer"]["path"] not in self.registry["indexer"] or
-            content_json["retriever"]["path"] not in self.registry["retriever"] or
-            content_json["augmenter"]["path"] not in self.registry["augmenter"] or
-            content_json["generator"]["path"] not in self.registry["generator"]):
+        if not self.valid_paths(content_json):
             await self.send_json({"status": "error",
                                   "message": "Bad function path"})
             return
@@ -424,11 +1020,18 @@ class KMEConsumer(AsyncJsonWebsocketConsumer):
 
     async def handle_list_configs(self, args: List[Any]) -> None:
         """KernelCLI list_configs wrapper"""
-        # Use sync_to_async for DB operation
-        configs = await sync_to_async(self.cli.list_configs)()
+        # catalog is read from DB only on first use
+        configs = await db_read(self.cli.list_configs)(self.dispatcher.owners)
         await self.send_json({"status": "ok",
                               "configs": configs})
 
+    async def handle_stats(self, args: List[Any]) -> None:
+        """KernelCLI stats wrapper"""
+        kernels = await sync_to_async(self.cli.stats, thread_sensitive=False)()
+        await self.send_json({"status": "ok",
+                              "kernels": kernels,
+                              "rss_mb": round(sum(k["rss_mb"] for k in kernels), 1)})
+
     async def handle_get_config(self, args: List[Any]) -> None:
         """KernelCLI get_config wrapper"""
         if not args:
@@ -436,7 +1039,7 @@ class KMEConsumer(AsyncJsonWebsocketConsumer):
                                   "message": "No config_id provided"})
             return
         config_id = int(args[0])
-        config = await sync_to_async(self.cli.get_config)(config_id)
+        config = await db_read(self.cli.get_config)(config_id, self.dispatcher.owners)
         if config:
             await self.send_json({"status": "ok",
                                   "config_id": config_id,
@@ -476,7 +1079,7 @@ class KMEConsumer(AsyncJsonWebsocketConsumer):
 
     async def handle_list_scripts(self, args: List[Any]) -> None:
         """Return all script paths divided into visible and hidden."""
-        scripts = await sync_to_async(list)(Script.objects.all().values("path", "hidden"))
+        scripts = await db_read(list)(Script.objects.all().values("path", "hidden"))
         visible = [s["path"] for s in scripts if not s["hidden"]]
         hidden = [s["path"] for s in scripts if s["hidden"]]
         await self.send_json({
@@ -613,14 +1216,15 @@ class KMEConsumer(AsyncJsonWebsocketConsumer):
             return
 
         # Query calculations related to the config
-        calculations = await sync_to_async(list)(
+        calculations = await db_read(list)(
             Calculation.objects.filter(config_id=config_id)
             .order_by("-created_at")
-            .values("id", "status", "input", "output", "created_at", "updated_at")
+            .values("id", "status", "input", "output", "spans", "created_at", "updated_at")
         )
         for record in calculations:
             record["created_at"] = f"{record["created_at"]: %H:%M:%S %d/%m/%Y}"
             record["updated_at"] = f"{record["updated_at"]: %H:%M:%S %d/%m/%Y}"
+            record["spans"] = json.loads(record["spans"]) if record["spans"] else []
         await self.send_json({
             "status": "ok",
             "config_id": config_id,
@@ -0,0 +1,90 @@
+"""Async access to kmengine tables: parallel reads and batched calculation writes"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Tuple
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Calculation
+
+# Read-only queries don't need the single thread used by sync_to_async by default,
+# every thread of the pool keeps its own connection (WAL allows parallel readers)
+READ_EXECUTOR = ThreadPoolExecutor(max_workers=settings.KMENGINE_DB_READ_THREADS,
+                                   thread_name_prefix="kme-db-read")
+
+
+def db_read(func: Callable[..., Any]) -> Callable[..., Any]:
+    """sync_to_async for read-only ORM calls, executed in READ_EXECUTOR"""
+    return sync_to_async(func, thread_sensitive=False, executor=READ_EXECUTOR)
+
+
+class CalculationWriter:
+    """
+    Calculation creates and updates gathered for KMENGINE_DB_FLUSH_INTERVAL seconds
+    and written in one transaction, updates of the same calculation are merged.
+    """
+
+    def __init__(self):
+        self.creates: List[Tuple[Calculation, asyncio.Future]] = []
+        self.updates: Dict[int, Dict[str, Any]] = dict()  # calculation_id: fields
+        self.waiters: List[asyncio.Future] = []  # updates waiting for flush
+        self.flusher: asyncio.Task | None = None
+
+    async def create(self, **fields) -> Calculation:
+        """Saved Calculation with given fields"""
+        future = asyncio.get_running_loop().create_future()
+        self.creates.append((Calculation(**fields), future))
+        self.schedule()
+        return await future
+
+    async def update(self, calculation_id: int, wait: bool = False, **fields) -> None:
+        """Update calculation fields, wait=True returns after they are written"""
+        self.updates.setdefault(calculation_id, dict()).update(fields, updated_at=timezone.now())
+        future = None
+        if wait:
+            future = asyncio.get_running_loop().create_future()
+            self.waiters.append(future)
+        self.schedule()
+        if future is not None:
+            await future
+
+    def schedule(self) -> None:
+        """Start flushing task if there is none"""
+        if self.flusher is None or self.flusher.done():
+            self.flusher = asyncio.get_running_loop().create_task(self.flush_loop())
+
+    async def flush_loop(self) -> None:
+        """Write pending changes until there are none"""
+        while self.creates or self.updates:
+            await asyncio.sleep(settings.KMENGINE_DB_FLUSH_INTERVAL)
+            creates, self.creates = self.creates, []
+            updates, self.updates = self.updates, dict()
+            waiters, self.waiters = self.waiters, []
+            try:
+                await sync_to_async(self.write)([obj for obj, _ in creates], updates)
+            except Exception as e:
+                for future in [f for _, f in creates] + waiters:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for obj, future in creates:
+                if not future.done():
+                    future.set_result(obj)
+            for future in waiters:
+                if not future.done():
+                    future.set_result(None)
+
+    @staticmethod
+    def write(objs: List[Calculation], updates: Dict[int, Dict[str, Any]]) -> None:
+        """One transaction for all pending changes"""
+        with transaction.atomic():
+            if objs:
+                Calculation.objects.bulk_create(objs)
+            for calculation_id, fields in updates.items():
+                Calculation.objects.filter(id=calculation_id).update(**fields)
+
+
+CALCULATIONS = CalculationWriter()
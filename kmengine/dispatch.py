@@ -0,0 +1,422 @@
+"""Runs dispatching to the worker process owning pipeline kernels"""
+
+import os
+import json
+import base64
+import time
+import atexit
+import socket
+import asyncio
+import threading
+from datetime import timedelta
+from functools import partial
+from typing import Any, Callable, Dict, Optional
+from asgiref.sync import sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from utils import profiling
+from utils.tracing import SPANS_MIME
+from .models import Calculation, Config, PipelineOwner, RunJob
+from .db import CALCULATIONS, db_read
+from .inprocess import InProcessExecutor
+from .tracing import export_spans
+
+WORKER_ID = f"{socket.gethostname()}-{os.getpid()}"
+WORKERS_GROUP = "kme.workers"
+EVENTS_GROUP = "kme.events"
+
+
+def config_group(config_id: int) -> str:
+    """Channel layer group of clients following the pipeline"""
+    return f"kme.config.{config_id}"
+
+
+def events_group(config_id: Optional[int] = None) -> str:
+    """Channel layer group of clients subscribed to state events of all pipelines or one"""
+    return EVENTS_GROUP if config_id is None else f"{EVENTS_GROUP}.{config_id}"
+
+
+def owned_pipelines() -> Dict[int, str]:
+    """config_id: worker for pipelines of live workers"""
+    stale = timezone.now() - timedelta(seconds=3 * settings.KMENGINE_OWNER_HEARTBEAT)
+    return dict(PipelineOwner.objects.filter(heartbeat__gte=stale).values_list("config_id", "worker"))
+
+
+def request_kind(request: Dict[str, Any]) -> str:
+    """'query', 'batch' or 'index'"""
+    if request["kind"] == "run_batch":
+        return "batch"
+    return "index" if request["indexer"] == "true" else "query"
+
+
+def timeout_of(request: Dict[str, Any]) -> Optional[float]:
+    """Run timeout in seconds, from request or KMENGINE_RUN_TIMEOUTS"""
+    if request.get("timeout") is not None:
+        return float(request["timeout"])
+    return settings.KMENGINE_RUN_TIMEOUTS.get(request_kind(request))
+
+
+class Dispatcher:
+    """
+    Executes runs in local kernels of the worker owning the pipeline.
+    Output of runs is published to the pipeline group, whatever worker executes them.
+    Ownership is used only with shared channel layer (KMENGINE_ROUTE_RUNS).
+    """
+
+    _shared: "Dispatcher | None" = None
+
+    def __init__(self, cli):
+        self.cli = cli  # KernelCLI
+        self.layer = get_channel_layer()
+        self.channel: Optional[str] = None  # worker channel for forwarded runs
+        self.started = False
+        self.running: Dict[int, int] = dict()  # config_id: local runs in progress
+        self.runs: Dict[int, Dict[str, Any]] = dict()  # calculation_id: run state for cancel
+        self.tasks = set()
+        self.wakeup = asyncio.Event()  # set when new jobs are queued
+        self.owners: Dict[int, str] = dict()  # config_id: worker, refreshed by heartbeat
+        self.inprocess = InProcessExecutor(settings.KMENGINE_INPROCESS_WORKERS)
+        self.loop: asyncio.AbstractEventLoop | None = None
+        self.events: asyncio.Queue | None = None  # state events waiting to be published
+        cli.on_event = self.emit
+
+    @classmethod
+    def shared(cls, cli) -> "Dispatcher":
+        """Process-wide instance"""
+        if cls._shared is None:
+            cls._shared = cls(cli)
+            atexit.register(cls._shared.release_all)
+        return cls._shared
+
+    @property
+    def routed(self) -> bool:
+        """True if several processes share channel layer"""
+        return settings.KMENGINE_ROUTE_RUNS
+
+    def spawn(self, coro) -> asyncio.Task:
+        """Background task, kept referenced until done"""
+        task = asyncio.get_running_loop().create_task(coro)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task
+
+    async def start(self) -> None:
+        """Start publishing state events, open worker channel and listen for wake-ups and closes"""
+        if self.loop is None:
+            self.loop = asyncio.get_running_loop()
+            self.events = asyncio.Queue()
+            self.spawn(self.publish_events())
+        if self.started or not self.routed:
+            return
+        self.started = True
+        self.channel = await self.layer.new_channel("kme.worker.")
+        self.spawn(self.listen())
+        self.spawn(self.heartbeat())
+
+    async def listen(self) -> None:
+        """Serve messages sent to worker channel"""
+        while True:
+            message = await self.layer.receive(self.channel)
+            kind = message.get("type")
+            if kind == "kme.close":
+                await self.close(message["config_id"])
+            elif kind == "kme.cancel":
+                await self.cancel(message["calculation_id"])
+            elif kind == "kme.wakeup":
+                self.wakeup.set()
+
+    async def heartbeat(self) -> None:
+        """Keep ownership of live pipelines, give up the rest"""
+        while True:
+            try:
+                await sync_to_async(self.refresh_ownership)()
+            except Exception as e:
+                print(f"Ownership heartbeat failed: {e}")
+            await asyncio.sleep(settings.KMENGINE_OWNER_HEARTBEAT)
+
+    def refresh_ownership(self) -> None:
+        """Update heartbeat of owned pipelines, drop ownership of stopped ones"""
+        owned = PipelineOwner.objects.filter(worker=WORKER_ID)
+        keep = set(self.cli.pipelines) | {c for c, n in self.running.items() if n}
+        owned.exclude(config_id__in=keep).delete()
+        owned.update(heartbeat=timezone.now())
+        self.owners = owned_pipelines()
+
+    def claim(self, config_id: int) -> PipelineOwner:
+        """Owner of the pipeline, this worker if there is none or it is stale"""
+        stale = timezone.now() - timedelta(seconds=3 * settings.KMENGINE_OWNER_HEARTBEAT)
+        for _ in range(2):
+            try:
+                with transaction.atomic():
+                    owner = PipelineOwner.objects.select_for_update().filter(config_id=config_id).first()
+                    if owner is None:
+                        return PipelineOwner.objects.create(
+                            config_id=config_id, worker=WORKER_ID,
+                            channel=self.channel, heartbeat=timezone.now())
+                    if owner.worker == WORKER_ID or owner.heartbeat < stale:
+                        owner.worker, owner.channel, owner.heartbeat = WORKER_ID, self.channel, timezone.now()
+                        owner.save()
+                    return owner
+            except IntegrityError:
+                continue  # claimed concurrently, read it again
+        return PipelineOwner.objects.get(config_id=config_id)
+
+    def release_all(self) -> None:
+        """Give up ownership of all pipelines of this worker"""
+        if self.routed:
+            try:
+                PipelineOwner.objects.filter(worker=WORKER_ID).delete()
+            except Exception as e:
+                print(f"Ownership release failed: {e}")
+
+    async def publish(self, config_id: int, payload: Dict[str, Any]) -> None:
+        """Send message to all clients following the pipeline"""
+        await self.layer.group_send(config_group(config_id), {"type": "kme.output", "payload": payload})
+
+    def emit(self, payload: Dict[str, Any]) -> None:
+        """
+        Queue state event for subscribers (safe to call from any thread),
+        payload has 'kind' ('kernel' or 'calculation') and 'config_id'.
+        """
+        if self.loop is None or self.loop.is_closed():
+            return
+        payload = {"status": "event", "worker": WORKER_ID, "time": round(time.time(), 3), **payload}
+        self.loop.call_soon_threadsafe(self.events.put_nowait, payload)
+
+    async def publish_events(self) -> None:
+        """Send queued state events in order to subscribers of all pipelines and of the one"""
+        while True:
+            payload = await self.events.get()
+            message = {"type": "kme.event", "payload": payload}
+            try:
+                await self.layer.group_send(events_group(), message)
+                await self.layer.group_send(events_group(payload["config_id"]), message)
+            except Exception as e:
+                print(f"State event publishing failed: {e}")
+
+    def calculation_event(self, config_id: int, calculation_id: int, status: str) -> None:
+        """Queue calculation status change event"""
+        self.emit({"kind": "calculation", "config_id": config_id,
+                   "calculation_id": calculation_id, "calculation_status": status})
+
+    async def notify(self) -> None:
+        """Wake up job runners after new jobs were queued"""
+        if self.routed:
+            await self.layer.group_send(WORKERS_GROUP, {"type": "kme.wakeup"})
+        else:
+            self.wakeup.set()
+
+    async def close(self, config_id: int) -> str:
+        """Close pipeline here or on the worker owning it"""
+        if self.routed:
+            owner = await sync_to_async(PipelineOwner.objects.filter(config_id=config_id).first)()
+            if owner is not None and owner.worker != WORKER_ID:
+                await self.layer.send(owner.channel, {"type": "kme.close", "config_id": config_id})
+                return f"Pipeline {config_id} close sent to {owner.worker}\n"
+        msg = await sync_to_async(self.cli.close_pipeline)(config_id)
+        if self.routed:
+            await sync_to_async(PipelineOwner.objects.filter(config_id=config_id, worker=WORKER_ID).delete)()
+        return msg
+
+    def runner(self, request: Dict[str, Any]) -> Callable[..., str]:
+        """KernelCLI method executing the request"""
+        if request["kind"] == "run_batch":
+            return partial(self.cli.run_batch_kernel, queries=request["queries"],
+                           concurrency=request["concurrency"], profile=request.get("profile", False))
+        return partial(self.cli.run_pipeline_kernel, indexer=request["indexer"],
+                       path_or_query=request["path_or_query"], profile=request.get("profile", False))
+
+    async def execute(self, config_id: int, request: Dict[str, Any], job_id: Optional[int] = None) -> str:
+        """
+        Create Calculation (linked to RunJob job_id), run request in pipeline kernel,
+        publish output and store accumulated output. Returns calculation status.
+        """
+        self.running[config_id] = self.running.get(config_id, 0) + 1
+        calculation = None
+        status = "fail"
+        try:
+            config = await db_read(Config.objects.get)(id=config_id)
+            content_ = config.content
+            calculation = await CALCULATIONS.create(
+                status='running',
+                config_id=config_id,
+                input=request["input"]
+            )
+            self.calculation_event(config_id, calculation.id, "running")
+            if job_id is not None:
+                await sync_to_async(RunJob.objects.filter(id=job_id).update)(calculation=calculation)
+            status = await self.run_calculation(config, calculation, content_, request, timeout_of(request), job_id)
+        except Exception as e:
+            if calculation is not None:
+                await CALCULATIONS.update(calculation.id, wait=True, status="fail")
+                self.calculation_event(config_id, calculation.id, "fail")
+            await self.publish(config_id, {"status": "error",
+                                           "from": [config_id, getattr(calculation, "id", None)],
+                                           "job_id": job_id,
+                                           "message": str(e)})
+        finally:
+            self.running[config_id] -= 1
+        return status
+
+    async def run_calculation(self, config: Config, calculation: Calculation, content_: str,
+                              request: Dict[str, Any], timeout: Optional[float] = None,
+                              job_id: Optional[int] = None) -> str:
+        """
+        Run request in pipeline kernel or in process (Config.executor).
+        Run is interrupted after timeout seconds or by cancel().
+        Finish message carries job_id, so clients can match it with their run.
+        """
+        config_id = config.id
+        loop = asyncio.get_running_loop()
+
+        async def send_queued(position, eta):
+            await self.publish(config_id, {"status": "queued",
+                                           "from": [config_id, calculation.id],
+                                           "position": position,
+                                           "eta": eta})
+
+        output_accumulator = []
+
+        async def send_output(text):
+            await self.publish(config_id, {"status": "output",
+                                           "from": [config_id, calculation.id],
+                                           "output": text})
+
+        def on_output(text):
+            output_accumulator.append(text)
+            asyncio.run_coroutine_threadsafe(send_output(text), loop)
+
+        spans = []  # stage spans reported by the run (utils.tracing)
+        profile = dict()  # artifact and summary if request was profiled (utils.profiling)
+
+        def on_data(mime, value):
+            if mime == SPANS_MIME:
+                spans.extend(value)
+            elif mime == profiling.PROFILE_MIME:
+                profile.update(value)
+
+        run = {"config_id": config_id, "kernel_id": None, "future": None, "reason": None,
+               "stop": threading.Event(), "task": asyncio.current_task()}
+        self.runs[calculation.id] = run
+        try:
+            status = await self.run_in_kernel(run, config, content_, request, on_output, on_data,
+                                              send_queued, timeout)
+        except asyncio.CancelledError:
+            if run["reason"] is None:
+                raise
+            run["task"].uncancel()  # cancelled while waiting for kernel
+            status = run["reason"]
+        finally:
+            del self.runs[calculation.id]
+        if run["reason"] is not None:
+            status = run["reason"]
+            on_output(f"\n⛔ Run {status}\n")
+
+        # Store the accumulated output in the Calculation.output field
+        full_output = "".join(output_accumulator)
+        fields = {"output": full_output, "status": status, "spans": json.dumps(spans) if spans else ""}
+        if profile:
+            fields["profile"] = base64.b64decode(profile["artifact"])
+        await CALCULATIONS.update(calculation.id, wait=True, **fields)
+        self.calculation_event(config_id, calculation.id, status)
+        if spans and settings.KMENGINE_TRACE_FILE:
+            try:
+                await sync_to_async(export_spans, thread_sensitive=False)(
+                    settings.KMENGINE_TRACE_FILE, config_id, calculation.id, status, spans)
+            except OSError as e:
+                print(f"Spans export failed: {e}")
+
+        if profile:
+            await self.publish(config_id, {"status": "profile",
+                                           "from": [config_id, calculation.id],
+                                           "profile": profile["summary"]})
+        await self.publish(config_id, {"status": "ok",
+                                       "from": [config_id, calculation.id],
+                                       "job_id": job_id,
+                                       "run_status": status,
+                                       "message": "Execution finished"})
+        return status
+
+    async def run_in_kernel(self, run: Dict[str, Any], config: Config, content_: str,
+                            request: Dict[str, Any], on_output: Callable[[str], None],
+                            on_data: Callable[[str, Any], None],
+                            send_queued: Callable[..., Any], timeout: Optional[float]) -> str:
+        """Acquire pipeline kernel and execute request in it, 'inprocess' configs skip kernels"""
+        if config.executor == "inprocess":
+            run["future"] = asyncio.wrap_future(self.inprocess.submit(content_, request, on_output, on_data))
+            return await self.wait_run(run, on_output, timeout)
+        loop = asyncio.get_running_loop()
+        # Get idle kernel of the pipeline, start a replica or wait in its queue
+        kernel_id, need_init = await self.cli.acquire_kernel(config, send_queued)
+        run["kernel_id"] = kernel_id
+        started = time.monotonic()
+        try:
+            run["future"] = loop.run_in_executor(
+                None,
+                partial(self.runner(request), kernel_id, content_,
+                        on_output=on_output, on_data=on_data, need_init=need_init, stop=run["stop"])
+            )
+            return await self.wait_run(run, on_output, timeout)
+        finally:
+            self.cli.release_kernel(config.id, kernel_id, time.monotonic() - started)
+
+    async def wait_run(self, run: Dict[str, Any], on_output: Callable[[str], None],
+                       timeout: Optional[float]) -> str:
+        """Result of started run, interrupted after timeout seconds"""
+        try:
+            return await asyncio.wait_for(asyncio.shield(run["future"]), timeout)
+        except asyncio.TimeoutError:
+            on_output(f"\n⏱ Timeout of {timeout} s exceeded\n")
+            return await self.interrupt(run, "timeout")
+        except asyncio.CancelledError:
+            if run["reason"] is not None:
+                await self.interrupt(run, run["reason"])
+            raise
+
+    async def interrupt(self, run: Dict[str, Any], reason: str) -> str:
+        """
+        Interrupt kernel executing the run, its state is kept.
+        Kernel is restarted if it ignores interrupt for KMENGINE_INTERRUPT_GRACE seconds.
+        """
+        run["reason"] = reason
+        if run["kernel_id"] is None:
+            # in-process run: its task is cancelled
+            run["future"].cancel()
+            return reason
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.cli.km.interrupt_kernel, run["kernel_id"])
+        try:
+            return await asyncio.wait_for(asyncio.shield(run["future"]), settings.KMENGINE_INTERRUPT_GRACE)
+        except asyncio.TimeoutError:
+            run["stop"].set()
+            await loop.run_in_executor(None, self.cli.restart_kernel, run["config_id"], run["kernel_id"])
+            return await run["future"]
+
+    async def cancel(self, calculation_id: int) -> str:
+        """Cancel running calculation here or on the worker owning its pipeline"""
+        run = self.runs.get(calculation_id)
+        if run is None:
+            if self.routed:
+                calculation = await sync_to_async(
+                    Calculation.objects.filter(id=calculation_id, status="running").first)()
+                owner = None
+                if calculation is not None:
+                    owner = await sync_to_async(
+                        PipelineOwner.objects.filter(config_id=calculation.config_id).first)()
+                if owner is not None and owner.worker != WORKER_ID:
+                    await self.layer.send(owner.channel, {"type": "kme.cancel",
+                                                          "calculation_id": calculation_id})
+                    return f"Calculation {calculation_id} cancel sent to {owner.worker}"
+            return f"Calculation {calculation_id} is not running"
+        if run["reason"] is not None:
+            return f"Calculation {calculation_id} is already stopping"
+        if run["future"] is None:
+            # still waiting for kernel
+            run["reason"] = "cancelled"
+            run["task"].cancel()
+        else:
+            self.spawn(self.interrupt(run, "cancelled"))
+        return f"Calculation {calculation_id} cancel requested"
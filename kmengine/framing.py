@@ -0,0 +1,161 @@
+"""
+Websocket framings of KMEConsumer, negotiated by subprotocol.
+
+Without subprotocol every message is a JSON text frame.
+With 'kme.compact.v1' or 'kme.msgpack.v1' server sends binary frames, first byte is frame kind:
+    FRAME_MESSAGE  message encoded as UTF-8 JSON (compact) or msgpack
+    FRAME_DEFLATE  the same, zlib compressed (messages above KMENGINE_WS_DEFLATE_MIN bytes)
+    FRAME_OUTPUT   output chunks: records of u32 stream id, u32 length, UTF-8 text
+    FRAME_BATCH    several frames, each prefixed with u32 length
+Stream id of a calculation output is announced once by {"status": "stream", "stream": id, "from": [...]}
+and closed after the final "ok"/"error" message of the calculation by {"status": "stream_closed", ...}.
+Client may send JSON text frames or FRAME_MESSAGE/FRAME_DEFLATE binary frames.
+"""
+
+import json
+import zlib
+import struct
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import msgpack
+except ImportError:  # kme.msgpack.v1 is not offered
+    msgpack = None
+
+FRAME_MESSAGE = 0
+FRAME_DEFLATE = 1
+FRAME_OUTPUT = 2
+FRAME_BATCH = 3
+
+RECORD_HEADER = struct.Struct("!II")  # stream id, text length
+
+
+class JsonFraming:
+    """Plain JSON text frames"""
+
+    name: Optional[str] = None
+
+    def encode(self, content: Dict[str, Any]) -> Tuple[Optional[str], Optional[bytes]]:
+        """(text_data, bytes_data) of server message"""
+        return json.dumps(content), None
+
+    def decode(self, text_data: Optional[str], bytes_data: Optional[bytes]) -> Any:
+        """Client message"""
+        if text_data is None:
+            raise ValueError("Binary frames are not negotiated")
+        return json.loads(text_data)
+
+
+class CompactFraming(JsonFraming):
+    """Binary frames with output streams and deflate of large messages, messages are JSON"""
+
+    name = "kme.compact.v1"
+
+    def __init__(self, deflate_min: Optional[int] = 4096):
+        self.deflate_min = deflate_min
+        self.streams: Dict[Tuple[int, int], int] = dict()  # (config_id, calculation_id): open stream id
+        self.last_stream = 0  # ids are not reused
+
+    def dumps(self, content: Any) -> bytes:
+        """Message bytes"""
+        return json.dumps(content, ensure_ascii=False).encode("utf-8")
+
+    def loads(self, data: bytes) -> Any:
+        """Message from bytes"""
+        return json.loads(data)
+
+    def message(self, content: Any) -> bytes:
+        """FRAME_MESSAGE or FRAME_DEFLATE frame"""
+        data = self.dumps(content)
+        if self.deflate_min is not None and len(data) >= self.deflate_min:
+            return bytes([FRAME_DEFLATE]) + zlib.compress(data, 6)
+        return bytes([FRAME_MESSAGE]) + data
+
+    def encode(self, content: Dict[str, Any]) -> Tuple[Optional[str], Optional[bytes]]:
+        """Output chunks become stream records, the rest are messages"""
+        if content.get("status") in ("ok", "error") and "from" in content:
+            stream = self.streams.pop(tuple(content["from"]), None)
+            if stream is not None:
+                # calculation finished, its stream is forgotten
+                return None, self.join(self.message(content), self.message(
+                    {"status": "stream_closed", "stream": stream, "from": content["from"]}))
+        if content.get("status") != "output" or len(content) != 3 or "from" not in content:
+            return None, self.message(content)
+        key = tuple(content["from"])
+        frame = b""
+        stream = self.streams.get(key)
+        if stream is None:
+            self.last_stream += 1
+            stream = self.streams[key] = self.last_stream
+            frame = self.message({"status": "stream", "stream": stream, "from": list(key)})
+        text = content["output"].encode("utf-8")
+        records = bytes([FRAME_OUTPUT]) + RECORD_HEADER.pack(stream, len(text)) + text
+        if frame:
+            # announcement goes first in the same websocket message
+            return None, self.join(frame, records)
+        return None, records
+
+    @staticmethod
+    def join(*frames: bytes) -> bytes:
+        """FRAME_BATCH of several frames"""
+        return bytes([FRAME_BATCH]) + b"".join(struct.pack("!I", len(f)) + f for f in frames)
+
+    def decode(self, text_data: Optional[str], bytes_data: Optional[bytes]) -> Any:
+        """Client message from JSON text or binary message frame"""
+        if text_data is not None:
+            return json.loads(text_data)
+        kind, data = bytes_data[0], bytes_data[1:]
+        if kind == FRAME_DEFLATE:
+            data = zlib.decompress(data)
+        elif kind != FRAME_MESSAGE:
+            raise ValueError(f"Unexpected frame kind {kind}")
+        return self.loads(data)
+
+    def parse(self, bytes_data: bytes) -> List[Any]:
+        """
+        Server frame as list of messages, for clients and benchmarks.
+        Output records are returned as {"status": "output", "stream": id, "output": text}.
+        """
+        kind, data = bytes_data[0], bytes_data[1:]
+        if kind == FRAME_BATCH:
+            ret, offset = [], 0
+            while offset < len(data):
+                (length,) = struct.unpack_from("!I", data, offset)
+                ret += self.parse(data[offset + 4:offset + 4 + length])
+                offset += 4 + length
+            return ret
+        if kind == FRAME_OUTPUT:
+            ret, offset = [], 0
+            while offset < len(data):
+                stream, length = RECORD_HEADER.unpack_from(data, offset)
+                offset += RECORD_HEADER.size
+                ret.append({"status": "output", "stream": stream,
+                            "output": data[offset:offset + length].decode("utf-8")})
+                offset += length
+            return ret
+        return [self.decode(None, bytes_data)]
+
+
+class MsgpackFraming(CompactFraming):
+    """Compact framing with msgpack encoded messages"""
+
+    name = "kme.msgpack.v1"
+
+    def dumps(self, content: Any) -> bytes:
+        return msgpack.packb(content, use_bin_type=True)
+
+    def loads(self, data: bytes) -> Any:
+        return msgpack.unpackb(data, raw=False, strict_map_key=False)
+
+
+def framings() -> List[type]:
+    """Available framings in order of preference"""
+    return [MsgpackFraming, CompactFraming] if msgpack is not None else [CompactFraming]
+
+
+def negotiate(offered: List[str], deflate_min: Optional[int] = 4096) -> JsonFraming:
+    """Framing for subprotocols offered by client, JSON if none is supported"""
+    for framing in framings():
+        if framing.name in offered:
+            return framing(deflate_min)
+    return JsonFraming()
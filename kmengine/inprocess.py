@@ -0,0 +1,132 @@
+"""In-process execution of trusted pipelines, without Jupyter kernels"""
+
+import sys
+import asyncio
+import threading
+import traceback
+import contextvars
+import concurrent.futures
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional
+
+import utils.tqdm_global_config  # noqa: F401  same progress bars as in kernels
+from utils import profiling, tracing
+from utils.fnuser import execute_request
+
+
+class _Sink:
+    """Output of one run, written text is passed on by lines or on flush"""
+
+    def __init__(self, on_output: Callable[[str], None]):
+        self.on_output = on_output
+        self.buffer: List[str] = []
+
+    def write(self, text: str) -> None:
+        """Buffer text, pass it on at line end or carriage return"""
+        self.buffer.append(text)
+        if "\n" in text or "\r" in text:
+            self.flush()
+
+    def flush(self) -> None:
+        """Pass buffered text on"""
+        if not self.buffer:
+            return
+        text = "".join(self.buffer)
+        self.buffer = []
+        if "\r" in text:
+            # progress bar redraw, only its last state matters
+            self.on_output("\r" + text.rsplit("\r", 1)[-1])
+        else:
+            self.on_output(text)
+
+
+# Output sink of the run executed by current task, None outside of runs
+OUTPUT: contextvars.ContextVar[Optional[_Sink]] = contextvars.ContextVar("kme_output", default=None)
+
+
+class _Redirect:
+    """sys.stdout/sys.stderr replacement passing writes of runs to their output sink"""
+
+    def __init__(self, stream: Any):
+        self.stream = stream
+
+    def write(self, text: str) -> int:
+        """Write to sink of the current run or to the original stream"""
+        sink = OUTPUT.get()
+        if sink is None:
+            return self.stream.write(text)
+        if text:
+            sink.write(text)
+        return len(text)
+
+    def flush(self) -> None:
+        """Flush sink of the current run or the original stream"""
+        sink = OUTPUT.get()
+        if sink is None:
+            self.stream.flush()
+        else:
+            sink.flush()
+
+    def isatty(self) -> bool:
+        """Runs get no terminal, progress bars redraw with carriage returns"""
+        return OUTPUT.get() is None and self.stream.isatty()
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.stream, name)
+
+
+class InProcessExecutor:
+    """
+    Runs requests with utils.fnuser.execute_request in event loops of worker threads,
+    so blocking components don't stop the server loop. Printed output of every run goes to
+    its on_output the same way as kernel stream messages.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = max(1, workers)
+        self.loops: List[asyncio.AbstractEventLoop] = []
+        self.next = 0
+        self.lock = threading.Lock()
+
+    def loop(self) -> asyncio.AbstractEventLoop:
+        """Worker loop for the next run, threads are started on first use"""
+        with self.lock:
+            if not self.loops:
+                if not isinstance(sys.stdout, _Redirect):
+                    sys.stdout = _Redirect(sys.stdout)
+                    sys.stderr = _Redirect(sys.stderr)
+                for i in range(self.workers):
+                    loop = asyncio.new_event_loop()
+                    threading.Thread(target=loop.run_forever, name=f"kme-inprocess-{i}", daemon=True).start()
+                    self.loops.append(loop)
+            self.next = (self.next + 1) % len(self.loops)
+            return self.loops[self.next]
+
+    def submit(self, content_: str, request: Dict[str, Any], on_output: Callable[[str], None],
+               on_data: Optional[Callable[[str, Any], None]] = None) -> concurrent.futures.Future:
+        """Start run, future result is 'ok' or 'fail', cancelling it cancels the run"""
+        return asyncio.run_coroutine_threadsafe(self.run(content_, request, on_output, on_data), self.loop())
+
+    @staticmethod
+    async def run(content_: str, request: Dict[str, Any], on_output: Callable[[str], None],
+                  on_data: Optional[Callable[[str, Any], None]] = None) -> str:
+        """
+        Execute request with output of this task (and tasks it starts) sent to on_output,
+        spans and profile go to on_data with their kernel display_data mime types.
+        """
+        sink = _Sink(on_output)
+        OUTPUT.set(sink)
+        if on_data is not None:
+            tracing.SINK.set(partial(on_data, tracing.SPANS_MIME))
+            profiling.SINK.set(partial(on_data, profiling.PROFILE_MIME))
+        request = dict(request, content=content_, indexer=request.get("indexer") == "true")
+        try:
+            await execute_request(request)
+        except Exception:
+            sink.flush()
+            on_output("❌ Error:\n" + traceback.format_exc() + "\n")
+            return "fail"
+        finally:
+            sink.flush()
+            OUTPUT.set(None)
+        return "ok"
@@ -0,0 +1,156 @@
+"""Durable run queue and its execution"""
+
+import os
+import json
+import time
+import socket
+import asyncio
+from datetime import timedelta
+from typing import Any, Dict, Optional
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Count
+from django.utils import timezone
+
+from .models import Calculation, Config, RunJob
+from .dispatch import WORKER_ID, WORKERS_GROUP, Dispatcher, request_kind
+
+# Interactive queries go first, offline evaluation next, indexing last
+JOB_PRIORITIES = {
+    "query": 2,
+    "batch": 1,
+    "index": 0,
+}
+
+
+def priority_of(request: Dict[str, Any]) -> int:
+    """Queue priority of run request"""
+    return JOB_PRIORITIES[request_kind(request)]
+
+
+def enqueue(config_id: int, request: Dict[str, Any]) -> RunJob:
+    """Store run request in the queue"""
+    return RunJob.objects.create(config_id=config_id,
+                                 request=json.dumps(request, ensure_ascii=False),
+                                 priority=priority_of(request))
+
+
+def worker_dead(worker: str) -> bool:
+    """True if worker was a process of this host that is gone"""
+    host, _, pid = worker.rpartition("-")
+    if host != socket.gethostname() or not pid.isdigit():
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except OSError:
+        return False
+    return False
+
+
+class JobRunner:
+    """
+    Takes queued RunJobs by priority and executes them in kernels of this process.
+    Limits: KMENGINE_WORKER_CONCURRENCY runs per process, KMENGINE_GLOBAL_CONCURRENCY
+    runs of all workers, Config.max_replicas runs per pipeline.
+    Jobs of pipelines owned by other live workers are left to them,
+    jobs of dead workers are queued again.
+    """
+
+    _shared: "JobRunner | None" = None
+
+    def __init__(self, dispatcher: Dispatcher, concurrency: int):
+        self.dispatcher = dispatcher
+        self.concurrency = max(1, concurrency)
+        self.active = set()
+        self.task: asyncio.Task | None = None
+        self.beat = 0.0  # monotonic time of last running jobs heartbeat
+
+    @classmethod
+    def shared(cls, dispatcher: Dispatcher) -> "JobRunner":
+        """Process-wide instance for web server executing runs itself"""
+        if cls._shared is None:
+            cls._shared = cls(dispatcher, settings.KMENGINE_WORKER_CONCURRENCY)
+        return cls._shared
+
+    def start(self) -> None:
+        """Serve queue in background"""
+        if self.task is None or self.task.done():
+            self.task = self.dispatcher.spawn(self.serve())
+
+    async def serve(self) -> None:
+        """Execute jobs forever, wake up on new jobs or every KMENGINE_WORKER_POLL seconds"""
+        await self.dispatcher.start()
+        layer = self.dispatcher.layer
+        print(f"Worker {WORKER_ID} is ready, up to {self.concurrency} runs at once")
+        requeued = await sync_to_async(self.requeue_lost)()
+        if requeued:
+            print(f"{requeued} interrupted runs queued again")
+        while True:
+            self.dispatcher.wakeup.clear()
+            if self.dispatcher.channel is not None:
+                # group membership expires, renew it while waiting
+                await layer.group_add(WORKERS_GROUP, self.dispatcher.channel)
+            if time.monotonic() - self.beat > settings.KMENGINE_OWNER_HEARTBEAT:
+                self.beat = time.monotonic()
+                await sync_to_async(self.heartbeat)()
+            while len(self.active) < self.concurrency:
+                job = await sync_to_async(self.take)()
+                if job is None:
+                    break
+                task = self.dispatcher.spawn(self.run(job))
+                self.active.add(task)
+                task.add_done_callback(self.active.discard)
+            waiters = [asyncio.ensure_future(self.dispatcher.wakeup.wait())]
+            waiters += list(self.active)
+            await asyncio.wait(waiters, timeout=settings.KMENGINE_WORKER_POLL,
+                               return_when=asyncio.FIRST_COMPLETED)
+            waiters[0].cancel()
+
+    def heartbeat(self) -> None:
+        """Show that running jobs of this worker are alive, requeue lost ones of others"""
+        RunJob.objects.filter(status="running", worker=WORKER_ID).update(updated_at=timezone.now())
+        self.requeue_lost()
+
+    def requeue_lost(self) -> int:
+        """Queue again jobs of dead or silent workers, their calculations fail"""
+        stale = timezone.now() - timedelta(seconds=3 * settings.KMENGINE_OWNER_HEARTBEAT)
+        count = 0
+        for job in RunJob.objects.filter(status="running").exclude(worker=WORKER_ID):
+            if job.updated_at >= stale and not worker_dead(job.worker):
+                continue
+            if RunJob.objects.filter(id=job.id, status="running", worker=job.worker).update(
+                    status="queued", worker="", calculation=None):
+                count += 1
+                if job.calculation_id is not None and Calculation.objects.filter(
+                        id=job.calculation_id, status="running").update(status="fail"):
+                    self.dispatcher.calculation_event(job.config_id, job.calculation_id, "fail")
+        return count
+
+    def take(self) -> Optional[RunJob]:
+        """Mark first queued job allowed by limits as running by this worker"""
+        running = dict(RunJob.objects.filter(status="running")
+                       .values_list("config_id").annotate(n=Count("id")))
+        total = sum(running.values())
+        if settings.KMENGINE_GLOBAL_CONCURRENCY is not None and total >= settings.KMENGINE_GLOBAL_CONCURRENCY:
+            return None
+        queued = list(RunJob.objects.filter(status="queued").order_by("-priority", "id")[:100])
+        limits = dict(Config.objects.filter(id__in={job.config_id for job in queued})
+                      .values_list("id", "max_replicas"))
+        for job in queued:
+            if running.get(job.config_id, 0) >= limits.get(job.config_id, 1):
+                continue
+            if self.dispatcher.routed and self.dispatcher.claim(job.config_id).worker != WORKER_ID:
+                continue
+            # updated_at is the heartbeat of running jobs: a long wait in the queue is not silence
+            if RunJob.objects.filter(id=job.id, status="queued").update(
+                    status="running", worker=WORKER_ID, updated_at=timezone.now()):
+                return job
+        return None
+
+    async def run(self, job: RunJob) -> None:
+        """Execute job and store its final status"""
+        status = await self.dispatcher.execute(job.config_id, json.loads(job.request), job.id)
+        job_status = {"ok": "done", "cancelled": "cancelled"}.get(status, "fail")
+        await sync_to_async(RunJob.objects.filter(id=job.id).update)(status=job_status)
@@ -0,0 +1,74 @@
+"""Offline benchmark suite of pipelines, kernels and websocket streaming"""
+
+import os
+import json
+import asyncio
+import tempfile
+from pathlib import Path
+from django.core.management.base import BaseCommand, CommandError
+
+from kmengine.bench.corpus import CorpusServer, build_corpus
+from kmengine.bench.fake_ollama import FakeOllama
+from kmengine.bench.streaming import bench_streaming
+from kmengine.bench import suite
+
+BENCHMARKS = ("indexing", "queries", "kernels", "streaming")
+
+
+class Command(BaseCommand):
+    """python manage.py kmbench [--only indexing queries kernels streaming] [--output results.json]"""
+
+    help = ("Measure indexing throughput, query latency, kernel startup and websocket streaming "
+            "of default components against a local fake Ollama and static html corpus")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--only", nargs="+", choices=BENCHMARKS, default=list(BENCHMARKS))
+        parser.add_argument("--output", help="Also write results to this json file")
+        parser.add_argument("--pages", type=int, default=20, help="Corpus html pages")
+        parser.add_argument("--queries", type=int, default=30, help="Queries to measure")
+        parser.add_argument("--concurrency", type=int, default=4, help="Concurrency of batch run")
+        parser.add_argument("--kernels", type=int, default=3, help="Kernels to start")
+        parser.add_argument("--dim", type=int, default=1024, help="Embedding dimension")
+        parser.add_argument("--embed-latency", type=float, default=10, help="Fake embed request ms")
+        parser.add_argument("--ttft", type=float, default=50, help="Fake time to first token ms")
+        parser.add_argument("--token-rate", type=float, default=200, help="Fake tokens per second")
+        parser.add_argument("--tokens", type=int, default=64, help="Fake answer tokens")
+        parser.add_argument("--stream-tokens", type=int, default=20000, help="Tokens of framing benchmark")
+
+    def handle(self, *args, **options):
+        try:
+            suite.check_ollama_unbound()
+        except RuntimeError as e:
+            raise CommandError(str(e)) from e
+        fake = FakeOllama(dim=options["dim"], embed_latency=options["embed_latency"] / 1000,
+                          ttft=options["ttft"] / 1000, token_rate=options["token_rate"],
+                          tokens=options["tokens"]).start()
+        # module-level ollama client (model checks) and kernels started below use it too
+        os.environ["OLLAMA_HOST"] = fake.url
+        results = {"environment": suite.environment(),
+                   "parameters": {k: options[k] for k in ("pages", "queries", "concurrency", "kernels", "dim",
+                                                          "embed_latency", "ttft", "token_rate", "tokens")}}
+        with tempfile.TemporaryDirectory(prefix="kmbench") as tmp:
+            names = build_corpus(Path(tmp) / "corpus", options["pages"])
+            corpus = CorpusServer(Path(tmp) / "corpus").start()
+            try:
+                content = suite.pipeline_content(fake.url, str(Path(tmp) / "qdrant"), options["dim"])
+                urls = [corpus.url(name) for name in names]
+                selected = set(options["only"])
+                if selected & {"indexing", "queries"}:
+                    results["indexing"] = asyncio.run(suite.bench_indexing(content, urls, fake))
+                if "queries" in selected:
+                    results["queries"] = asyncio.run(suite.bench_queries(
+                        content, suite.make_queries(options["queries"]), options["concurrency"]))
+                if "kernels" in selected:
+                    results["kernels"] = suite.bench_kernel_startup(content, options["kernels"])
+                if "streaming" in selected:
+                    results["streaming"] = bench_streaming(options["stream_tokens"])
+            finally:
+                corpus.stop()
+                fake.stop()
+        results["fake_ollama_requests"] = fake.requests
+        text = json.dumps(results, indent=2, ensure_ascii=False)
+        if options["output"]:
+            Path(options["output"]).write_text(text + "\n", encoding="utf-8")
+        self.stdout.write(text)
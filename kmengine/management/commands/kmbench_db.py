@@ -0,0 +1,71 @@
+"""Run bookkeeping throughput benchmark"""
+
+import json
+import time
+import asyncio
+import statistics
+from asgiref.sync import sync_to_async
+from django.core.management.base import BaseCommand
+
+from kmengine.db import CALCULATIONS, db_read
+from kmengine.models import Calculation, Config
+
+
+class Command(BaseCommand):
+    """python manage.py kmbench_db [--runs N] [--concurrency N] [--mode direct|batched|both]"""
+
+    help = "Measure Calculation create/finish throughput with concurrent list reads"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--runs", type=int, default=500, help="Runs per mode")
+        parser.add_argument("--concurrency", type=int, default=32, help="Runs at once")
+        parser.add_argument("--mode", choices=["direct", "batched", "both"], default="both")
+
+    def handle(self, *args, **options):
+        config = Config.objects.create(name="kmbench_db", type="calculation", content="{}")
+        try:
+            modes = ["direct", "batched"] if options["mode"] == "both" else [options["mode"]]
+            results = [asyncio.run(self.bench(config.id, mode, options["runs"], options["concurrency"]))
+                       for mode in modes]
+        finally:
+            config.delete()
+        self.stdout.write(json.dumps(results, indent=2))
+
+    @staticmethod
+    async def bench(config_id: int, mode: str, runs: int, concurrency: int) -> dict:
+        """Runs create calculation, store output and list calculations of the config"""
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies = []
+
+        async def direct():
+            calculation = await sync_to_async(Calculation.objects.create)(
+                status="running", config_id=config_id, input="bench")
+            await sync_to_async(Calculation.objects.filter(id=calculation.id).update)(
+                output="x" * 1000, status="ok")
+
+        async def batched():
+            calculation = await CALCULATIONS.create(status="running", config_id=config_id, input="bench")
+            await CALCULATIONS.update(calculation.id, wait=True, output="x" * 1000, status="ok")
+
+        async def one(i):
+            async with semaphore:
+                start = time.perf_counter()
+                await (direct() if mode == "direct" else batched())
+                if i % 10 == 0:
+                    await db_read(list)(Calculation.objects.filter(config_id=config_id)
+                                        .order_by("-created_at").values("id", "status")[:50])
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(runs)))
+        elapsed = time.perf_counter() - start
+        latencies.sort()
+        return {
+            "mode": mode,
+            "runs": runs,
+            "concurrency": concurrency,
+            "seconds": round(elapsed, 3),
+            "runs_per_second": round(runs / elapsed, 1),
+            "latency_p50_ms": round(1000 * statistics.median(latencies), 2),
+            "latency_p95_ms": round(1000 * latencies[int(0.95 * (len(latencies) - 1))], 2),
+        }
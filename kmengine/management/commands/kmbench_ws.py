@@ -0,0 +1,20 @@
+"""Websocket framing benchmark: bytes and CPU per streamed token"""
+
+import json
+from django.core.management.base import BaseCommand
+
+from kmengine.bench.streaming import bench_streaming
+
+
+class Command(BaseCommand):
+    """python manage.py kmbench_ws [--tokens N] [--calculations N]"""
+
+    help = "Compare websocket framings on streamed output and large list_calculations reply"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tokens", type=int, default=20000, help="Streamed output chunks")
+        parser.add_argument("--calculations", type=int, default=200, help="Records in list reply")
+
+    def handle(self, *args, **options):
+        results = bench_streaming(options["tokens"], options["calculations"])
+        self.stdout.write(json.dumps(results, indent=2))
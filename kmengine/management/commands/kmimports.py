@@ -0,0 +1,36 @@
+"""Import time report of kernel startup and component scripts"""
+
+import json
+from django.core.management.base import BaseCommand
+
+from kmengine.consumers import KERNEL_INIT
+from utils.fnuser import resolve
+from utils.importtime import import_report
+
+
+class Command(BaseCommand):
+    """python manage.py kmimports [components.default ...] [--load] [--limit N]"""
+
+    help = "Per-module import cost (python -X importtime) of kernel init and component scripts"
+
+    def add_arguments(self, parser):
+        parser.add_argument("scripts", nargs="*", default=["components.default"],
+                            help="Component scripts, python paths like components.default")
+        parser.add_argument("--load", action="store_true",
+                            help="Also call every lazy module of the scripts (import cost of first run)")
+        parser.add_argument("--limit", type=int, default=25, help="Modules per list")
+
+    def handle(self, *args, **options):
+        # the same steps as a new kernel: KERNEL_INIT, then get_fn of pipeline components
+        init = KERNEL_INIT.replace("nest_asyncio.apply()", "")
+        reports = {"kernel_init": import_report(init, options["limit"])}
+        for script in options["scripts"]:
+            module_name, module_path, _ = resolve(script + ".fn")
+            code = f"{init}\nfrom utils.fnuser import load_module\nm = load_module({module_name!r}, {module_path!r})\n"
+            if options["load"]:
+                code += ("from utils.lazy import LazyModule\n"
+                         "[v._load() for v in vars(m).values() if isinstance(v, LazyModule)]\n")
+            report = import_report(code, options["limit"])
+            report["added_ms"] = round(report["imports_ms"] - reports["kernel_init"]["imports_ms"], 1)
+            reports[script] = report
+        self.stdout.write(json.dumps(reports, indent=2, ensure_ascii=False))
@@ -0,0 +1,32 @@
+"""Pipeline worker entry point"""
+
+import asyncio
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from kmengine.consumers import KernelCLI
+from kmengine.dispatch import Dispatcher
+from kmengine.jobs import JobRunner
+
+
+class Command(BaseCommand):
+    """python manage.py kmworker [--concurrency N]"""
+
+    help = "Own pipeline kernels and execute runs queued by web server (KMENGINE_EXECUTION=worker)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", type=int, default=settings.KMENGINE_WORKER_CONCURRENCY,
+                            help="Max runs executed at once")
+
+    def handle(self, *args, **options):
+        try:
+            asyncio.run(self.serve(options["concurrency"]))
+        except KeyboardInterrupt:
+            self.stdout.write("Worker stopped")
+
+    @staticmethod
+    async def serve(concurrency: int) -> None:
+        """Run job loop with process-wide kernels"""
+        cli = KernelCLI.shared()
+        cli.attach()  # periodic eviction of idle kernels
+        await JobRunner(Dispatcher.shared(cli), concurrency).serve()
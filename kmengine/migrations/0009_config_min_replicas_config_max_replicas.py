@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-19 09:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("kmengine", "0008_calculation_input_calculation_output"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="config",
+            name="min_replicas",
+            field=models.PositiveSmallIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name="config",
+            name="max_replicas",
+            field=models.PositiveSmallIntegerField(default=1),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2 on 2026-10-19 10:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("kmengine", "0009_config_min_replicas_config_max_replicas"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PipelineOwner",
+            fields=[
+                (
+                    "config",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="owner",
+                        serialize=False,
+                        to="kmengine.config",
+                    ),
+                ),
+                ("worker", models.CharField(max_length=255)),
+                ("channel", models.CharField(max_length=255)),
+                ("heartbeat", models.DateTimeField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2 on 2026-10-19 11:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("kmengine", "0010_pipelineowner"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RunJob",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("request", models.TextField()),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[("queued", "Queued"), ("running", "Running"), ("done", "Done"), ("fail", "Fail")],
+                        default="queued",
+                        max_length=7,
+                    ),
+                ),
+                ("worker", models.CharField(default="", max_length=255)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "config",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="jobs",
+                        to="kmengine.config",
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.CheckConstraint(
+                        condition=models.Q(("status__in", ["queued", "running", "done", "fail"])),
+                        name="runjob_status_valid",
+                    )
+                ],
+            },
+        ),
+    ]
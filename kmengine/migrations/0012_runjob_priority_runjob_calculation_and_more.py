@@ -0,0 +1,33 @@
+# Generated by Django 5.2 on 2026-10-19 12:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("kmengine", "0011_runjob"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="runjob",
+            name="priority",
+            field=models.SmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="runjob",
+            name="calculation",
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="jobs",
+                to="kmengine.calculation",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="runjob",
+            index=models.Index(fields=["status", "-priority", "id"], name="runjob_queue_idx"),
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.2 on 2026-10-19 13:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("kmengine", "0012_runjob_priority_runjob_calculation_and_more"),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name="calculation",
+            name="calculation_status_valid",
+        ),
+        migrations.RemoveConstraint(
+            model_name="runjob",
+            name="runjob_status_valid",
+        ),
+        migrations.AlterField(
+            model_name="calculation",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("running", "Running"),
+                    ("ok", "Ok"),
+                    ("fail", "Fail"),
+                    ("cancelled", "Cancelled"),
+                    ("timeout", "Timeout"),
+                ],
+                default="running",
+                max_length=9,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="runjob",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("queued", "Queued"),
+                    ("running", "Running"),
+                    ("done", "Done"),
+                    ("fail", "Fail"),
+                    ("cancelled", "Cancelled"),
+                ],
+                default="queued",
+                max_length=9,
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="calculation",
+            constraint=models.CheckConstraint(
+                condition=models.Q(("status__in", ["running", "ok", "fail", "cancelled", "timeout"])),
+                name="calculation_status_valid",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="runjob",
+            constraint=models.CheckConstraint(
+                condition=models.Q(("status__in", ["queued", "running", "done", "fail", "cancelled"])),
+                name="runjob_status_valid",
+            ),
+        ),
+    ]
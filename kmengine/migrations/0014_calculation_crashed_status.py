@@ -0,0 +1,40 @@
+# Generated by Django 5.2 on 2026-10-19 15:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("kmengine", "0013_calculation_cancelled_timeout_statuses"),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name="calculation",
+            name="calculation_status_valid",
+        ),
+        migrations.AlterField(
+            model_name="calculation",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("running", "Running"),
+                    ("ok", "Ok"),
+                    ("fail", "Fail"),
+                    ("cancelled", "Cancelled"),
+                    ("timeout", "Timeout"),
+                    ("crashed", "Crashed"),
+                ],
+                default="running",
+                max_length=9,
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="calculation",
+            constraint=models.CheckConstraint(
+                condition=models.Q(("status__in", ["running", "ok", "fail", "cancelled", "timeout", "crashed"])),
+                name="calculation_status_valid",
+            ),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2 on 2026-10-19 16:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("kmengine", "0014_calculation_crashed_status"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="config",
+            name="executor",
+            field=models.CharField(
+                choices=[("kernel", "Jupyter kernel"), ("inprocess", "In process")],
+                default="kernel",
+                max_length=9,
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="config",
+            constraint=models.CheckConstraint(
+                condition=models.Q(("executor__in", ["kernel", "inprocess"])),
+                name="config_executor_valid",
+            ),
+        ),
+    ]
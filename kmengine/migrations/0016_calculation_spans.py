@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-19 17:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("kmengine", "0015_config_executor"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="calculation",
+            name="spans",
+            field=models.TextField(default=""),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-19 18:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("kmengine", "0016_calculation_spans"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="calculation",
+            name="profile",
+            field=models.BinaryField(blank=True, null=True),
+        ),
+    ]
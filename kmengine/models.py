@@ -12,6 +12,22 @@ STATUS_CHOICES = [
     ('running', 'Running'),
     ('ok', 'Ok'),
     ('fail', 'Fail'),
+    ('cancelled', 'Cancelled'),
+    ('timeout', 'Timeout'),
+    ('crashed', 'Crashed'),
+]
+
+EXECUTOR_CHOICES = [
+    ('kernel', 'Jupyter kernel'),
+    ('inprocess', 'In process'),
+]
+
+JOB_STATUS_CHOICES = [
+    ('queued', 'Queued'),
+    ('running', 'Running'),
+    ('done', 'Done'),
+    ('fail', 'Fail'),
+    ('cancelled', 'Cancelled'),
 ]
 
 class Config(models.Model):
@@ -19,6 +35,9 @@ class Config(models.Model):
     name = models.CharField(max_length=255)
     type = models.CharField(max_length=15, choices=CONFIG_TYPE_CHOICES)
     content = models.TextField()
+    min_replicas = models.PositiveSmallIntegerField(default=1)
+    max_replicas = models.PositiveSmallIntegerField(default=1)
+    executor = models.CharField(max_length=9, choices=EXECUTOR_CHOICES, default='kernel')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -28,14 +47,20 @@ class Config(models.Model):
                 check=Q(type__in=[choice[0] for choice in CONFIG_TYPE_CHOICES]),
                 name="config_type_valid"
             ),
+            CheckConstraint(
+                check=Q(executor__in=[choice[0] for choice in EXECUTOR_CHOICES]),
+                name="config_executor_valid"
+            ),
         ]
 
 class Calculation(models.Model):
     """Calculation model"""
     config = models.ForeignKey(Config, on_delete=models.CASCADE, related_name='calculations')
-    status = models.CharField(max_length=7, choices=STATUS_CHOICES, default='running')
+    status = models.CharField(max_length=9, choices=STATUS_CHOICES, default='running')
     input = models.TextField(default="")
     output = models.TextField(default="")
+    spans = models.TextField(default="")  # json list of stage spans, see utils.tracing
+    profile = models.BinaryField(null=True, blank=True)  # cProfile stats of profiled runs, see utils.profiling
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -53,3 +78,32 @@ class Script(models.Model):
     hidden = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+class PipelineOwner(models.Model):
+    """Worker process owning kernels of the pipeline"""
+    config = models.OneToOneField(Config, on_delete=models.CASCADE, primary_key=True, related_name='owner')
+    worker = models.CharField(max_length=255)
+    channel = models.CharField(max_length=255)
+    heartbeat = models.DateTimeField()
+
+class RunJob(models.Model):
+    """Run waiting for or executed by pipeline worker"""
+    config = models.ForeignKey(Config, on_delete=models.CASCADE, related_name='jobs')
+    calculation = models.ForeignKey(Calculation, on_delete=models.SET_NULL, null=True, related_name='jobs')
+    request = models.TextField()
+    priority = models.SmallIntegerField(default=0)
+    status = models.CharField(max_length=9, choices=JOB_STATUS_CHOICES, default='queued')
+    worker = models.CharField(max_length=255, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            CheckConstraint(
+                check=Q(status__in=[choice[0] for choice in JOB_STATUS_CHOICES]),
+                name="runjob_status_valid"
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["status", "-priority", "id"], name="runjob_queue_idx"),
+        ]
@@ -0,0 +1,79 @@
+"""Kernel processes CPU and memory sampling"""
+
+import os
+import time
+from typing import Any, Dict, Optional, Tuple
+
+try:
+    import psutil
+except ImportError:  # /proc is used instead
+    psutil = None
+
+
+def kernel_pid(kernel_manager: Any) -> Optional[int]:
+    """Pid of the kernel process started by jupyter_client KernelManager"""
+    provisioner = getattr(kernel_manager, "provisioner", None)
+    pid = getattr(provisioner, "pid", None)
+    if pid is None:
+        pid = getattr(getattr(provisioner, "process", None), "pid", None)
+    return pid
+
+
+def _proc_times(pid: int) -> Tuple[float, int]:
+    """cpu seconds and rss bytes of the process from /proc"""
+    with open(f"/proc/{pid}/stat", encoding="utf-8") as stat:
+        # command may contain spaces, fields after it are fixed
+        fields = stat.read().rsplit(")", 1)[1].split()
+    ticks = os.sysconf("SC_CLK_TCK")
+    cpu = (int(fields[11]) + int(fields[12])) / ticks  # utime + stime
+    rss = int(fields[21]) * os.sysconf("SC_PAGE_SIZE")
+    return cpu, rss
+
+
+def _psutil_times(pid: int) -> Tuple[float, int]:
+    """cpu seconds and rss bytes of the process and its children"""
+    proc = psutil.Process(pid)
+    procs = [proc] + proc.children(recursive=True)
+    cpu, rss = 0.0, 0
+    for p in procs:
+        try:
+            times = p.cpu_times()
+            cpu += times.user + times.system
+            rss += p.memory_info().rss
+        except psutil.NoSuchProcess:
+            continue
+    return cpu, rss
+
+
+class ResourceSampler:
+    """CPU percent between consecutive samples and current RSS of processes"""
+
+    def __init__(self):
+        self.last: Dict[int, Tuple[float, float]] = dict()  # pid: (cpu seconds, wall time)
+
+    def sample(self, pid: Optional[int]) -> Optional[Dict[str, float]]:
+        """None if process is gone or can't be inspected"""
+        if pid is None:
+            return None
+        try:
+            cpu, rss = _psutil_times(pid) if psutil is not None else _proc_times(pid)
+        except Exception:
+            self.last.pop(pid, None)
+            return None
+        now = time.monotonic()
+        cpu_percent = None
+        if pid in self.last:
+            last_cpu, last_wall = self.last[pid]
+            if now > last_wall:
+                cpu_percent = round(100 * (cpu - last_cpu) / (now - last_wall), 1)
+        self.last[pid] = (cpu, now)
+        return {
+            "pid": pid,
+            "rss_mb": round(rss / 2 ** 20, 1),
+            "cpu_percent": cpu_percent,
+            "cpu_seconds": round(cpu, 2),
+        }
+
+    def forget(self, pid: Optional[int]) -> None:
+        """Drop history of finished process"""
+        self.last.pop(pid, None)
@@ -0,0 +1,207 @@
+"""Per-config kernel pools with queueing and replicas"""
+
+import time
+import asyncio
+import threading
+from collections import deque
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+KERNEL_STATES = ("starting", "failed", "idle", "busy", "restarting", "dead", "stopped", "evicted")
+
+
+class PipelinePool:
+    """
+    Kernels of one pipeline.
+    Every kernel executes one run at a time, runs above max_replicas wait in queue.
+    Kernel state changes are reported to listener(config_id, kernel_id, state),
+    state is one of KERNEL_STATES, kernel_id is None for 'starting' and 'failed'.
+    """
+
+    def __init__(self, config_id: int, min_replicas: int = 1, max_replicas: int = 1):
+        self.config_id = config_id
+        self.resize(min_replicas, max_replicas)
+        self.kernels: Dict[str, int] = dict()  # kernel_id: running executions
+        self.initialized = set()  # kernels with initial imports done
+        self.last_used: Dict[str, float] = dict()  # kernel_id: monotonic time of last release
+        self.starting = 0
+        self.acquiring = 0  # runs between pool lookup and getting a kernel, see KernelCLI.acquire_kernel
+        self.waiters: deque[asyncio.Future] = deque()
+        self.avg_duration: Optional[float] = None  # exponential moving average, seconds
+        self.listener: Optional[Callable[[int, Optional[str], str], None]] = None
+        # kernels are taken and released by runs on the event loop, restarted and evicted by other threads;
+        # state changes are reported outside of it
+        self.lock = threading.Lock()
+
+    def _emit(self, kernel_id: Optional[str], state: str) -> None:
+        """Report kernel state change"""
+        if self.listener is not None:
+            self.listener(self.config_id, kernel_id, state)
+
+    def resize(self, min_replicas: int, max_replicas: int) -> None:
+        """Set replicas bounds"""
+        self.max_replicas = max(1, max_replicas)
+        self.min_replicas = min(max(0, min_replicas), self.max_replicas)
+
+    @property
+    def busy(self) -> bool:
+        """True if pool has running, starting or queued runs"""
+        with self.lock:
+            return (self.acquiring > 0 or self.starting > 0 or bool(self.waiters)
+                    or any(self.kernels.values()))
+
+    def eta(self, position: int) -> Optional[float]:
+        """Expected wait in seconds for given queue position"""
+        if self.avg_duration is None:
+            return None
+        replicas = max(1, len(self.kernels) + self.starting)
+        return round(self.avg_duration * (position + replicas - 1) / replicas, 1)
+
+    def _pick(self) -> Optional[str]:
+        """Idle kernel, warm ones first"""
+        idle = [k for k, n in self.kernels.items() if n == 0]
+        if not idle:
+            return None
+        return min(idle, key=lambda k: (k not in self.initialized, -self.last_used.get(k, 0.0)))
+
+    def _claim(self) -> Optional[str]:
+        """Idle kernel marked as running"""
+        with self.lock:
+            kernel_id = self._pick()
+            if kernel_id is not None:
+                self.kernels[kernel_id] += 1
+            return kernel_id
+
+    def reserve_idle(self, kernel_id: str) -> bool:
+        """
+        Keep idle kernel from runs before it is shut down or restarted by another thread,
+        False if it is running meanwhile. Undo with release or remove.
+        """
+        with self.lock:
+            if self.kernels.get(kernel_id) != 0:
+                return False
+            self.kernels[kernel_id] = 1
+            return True
+
+    async def acquire(self, start_kernel: Callable[[], Awaitable[str]],
+                      on_queued: Callable[[int, Optional[float]], Awaitable[None]]) -> Tuple[str, bool]:
+        """
+        Get kernel for a run: idle one, new one if below max_replicas or wait in queue.
+        Returns kernel_id and True if kernel needs initial imports.
+        """
+        woken = False
+        while True:
+            kernel_id = self._claim()
+            if kernel_id is not None:
+                break
+            if len(self.kernels) + self.starting < self.max_replicas:
+                self.starting += 1
+                self._emit(None, "starting")
+                try:
+                    kernel_id = await start_kernel()
+                except asyncio.CancelledError:
+                    self._wake()  # the replica slot is free again
+                    raise
+                except Exception:
+                    self._emit(None, "failed")
+                    self._wake()
+                    raise
+                finally:
+                    self.starting -= 1
+                with self.lock:
+                    self.kernels[kernel_id] = 1
+                break
+            waiter = asyncio.get_running_loop().create_future()
+            if woken:
+                # lost the race for a released kernel, keep place at the head of the queue
+                self.waiters.appendleft(waiter)
+            else:
+                self.waiters.append(waiter)
+            try:
+                if not woken:
+                    await on_queued(len(self.waiters), self.eta(len(self.waiters)))
+                await waiter
+                woken = True
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    self._wake()  # pass the turn on
+                raise
+            finally:
+                if waiter in self.waiters:
+                    self.waiters.remove(waiter)
+        with self.lock:
+            need_init = kernel_id not in self.initialized
+            self.initialized.add(kernel_id)
+        self._emit(kernel_id, "busy")
+        return kernel_id, need_init
+
+    def release(self, kernel_id: str, duration: Optional[float] = None) -> None:
+        """Return kernel after run and wake up next queued run"""
+        idle = False
+        with self.lock:
+            if kernel_id in self.kernels:
+                self.kernels[kernel_id] = max(0, self.kernels[kernel_id] - 1)
+                self.last_used[kernel_id] = time.monotonic()
+                idle = self.kernels[kernel_id] == 0
+            if duration is not None:
+                if self.avg_duration is None:
+                    self.avg_duration = duration
+                else:
+                    self.avg_duration = 0.7 * self.avg_duration + 0.3 * duration
+        if idle:
+            self._emit(kernel_id, "idle")
+        self._wake()
+
+    def hold(self, kernel_id: str, state: str = "busy") -> None:
+        """Keep kernel from runs until release (e.g. while it is restarted)"""
+        with self.lock:
+            held = kernel_id in self.kernels
+            if held:
+                self.kernels[kernel_id] += 1
+        if held:
+            self._emit(kernel_id, state)
+
+    def remove(self, kernel_id: str, state: str = "dead") -> None:
+        """Forget kernel: 'dead', 'stopped' or 'evicted'"""
+        with self.lock:
+            known = self.kernels.pop(kernel_id, None) is not None
+            self.initialized.discard(kernel_id)
+            self.last_used.pop(kernel_id, None)
+        if known:
+            self._emit(kernel_id, state)
+        self._wake()
+
+    def _wake(self) -> None:
+        """Let first queued run try again (safe to call from any thread)"""
+        if self.waiters:
+            waiter = self.waiters.popleft()
+            waiter.get_loop().call_soon_threadsafe(self._resolve, waiter)
+
+    def _resolve(self, waiter: asyncio.Future) -> None:
+        """Wake waiter in its loop or pass the turn on if it is gone"""
+        if waiter.done():
+            self._wake()
+        else:
+            waiter.set_result(None)
+
+    def surplus(self, idle_for: float) -> List[str]:
+        """Idle kernels above min_replicas unused for idle_for seconds"""
+        now = time.monotonic()
+        with self.lock:
+            idle = [k for k, n in self.kernels.items()
+                    if n == 0 and now - self.last_used.get(k, now) >= idle_for]
+            extra = len(self.kernels) - self.min_replicas
+            idle.sort(key=lambda k: self.last_used.get(k, now))
+        return idle[:max(0, extra)]
+
+    def info(self) -> Dict[str, object]:
+        """Pool state for clients"""
+        with self.lock:
+            replicas, running = len(self.kernels), sum(self.kernels.values())
+        return {
+            "replicas": replicas,
+            "running": running,
+            "queued": len(self.waiters),
+            "min_replicas": self.min_replicas,
+            "max_replicas": self.max_replicas,
+            "avg_duration": None if self.avg_duration is None else round(self.avg_duration, 3),
+        }
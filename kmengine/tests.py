@@ -0,0 +1,30 @@
+"""Tests"""
+
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
+from django.test import TestCase
+from django.utils import timezone
+
+from .models import Config, RunJob
+from .jobs import JobRunner, enqueue
+
+
+class JobRunnerTest(TestCase):
+    """Run queue shared by several workers"""
+
+    def runner(self) -> JobRunner:
+        """JobRunner with a dispatcher that routes nothing"""
+        return JobRunner(SimpleNamespace(routed=False, calculation_event=mock.Mock()), 1)
+
+    def test_long_queued_job_is_not_requeued_when_taken(self):
+        """Job waiting longer than the heartbeat timeout stays with the worker that took it"""
+        config = Config.objects.create(name="queue", type="calculation", content="{}")
+        job = enqueue(config.id, {"kind": "run", "indexer": "false"})
+        RunJob.objects.filter(id=job.id).update(updated_at=timezone.now() - timedelta(hours=1))
+        with mock.patch("kmengine.jobs.WORKER_ID", "worker-a-1"):
+            self.assertEqual(self.runner().take().id, job.id)
+        with mock.patch("kmengine.jobs.WORKER_ID", "worker-b-2"):
+            self.assertEqual(self.runner().requeue_lost(), 0)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.worker), ("running", "worker-a-1"))
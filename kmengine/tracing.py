@@ -0,0 +1,55 @@
+"""Export of calculation spans as OpenTelemetry (OTLP/JSON) lines"""
+
+import os
+import json
+import threading
+from typing import Any, Dict, List
+
+_write_lock = threading.Lock()
+
+
+def _attribute(key: str, value: Any) -> Dict[str, Any]:
+    """OTLP KeyValue"""
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+def otlp_trace(config_id: int, calculation_id: int, status: str, spans: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """One OTLP/JSON ExportTraceServiceRequest with spans of the calculation"""
+    trace_id = os.urandom(16).hex()
+    span_ids = {s["id"]: os.urandom(8).hex() for s in spans}
+    otlp_spans = []
+    for s in spans:
+        attributes = [_attribute(k, v) for k, v in s["attrs"].items() if v is not None]
+        attributes += [_attribute("kme.config_id", config_id), _attribute("kme.calculation_id", calculation_id)]
+        otlp_span = {
+            "traceId": trace_id,
+            "spanId": span_ids[s["id"]],
+            "name": s["name"],
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(s["start"]),
+            "endTimeUnixNano": str(s["end"]),
+            "attributes": attributes,
+            "status": {"code": 2, "message": s["error"]} if "error" in s else {"code": 1},
+        }
+        if s["parent"] in span_ids:
+            otlp_span["parentSpanId"] = span_ids[s["parent"]]
+        otlp_spans.append(otlp_span)
+    return {"resourceSpans": [{
+        "resource": {"attributes": [_attribute("service.name", "kmengine"),
+                                    _attribute("kme.calculation_status", status)]},
+        "scopeSpans": [{"scope": {"name": "kmengine"}, "spans": otlp_spans}],
+    }]}
+
+
+def export_spans(path: str, config_id: int, calculation_id: int, status: str,
+                 spans: List[Dict[str, Any]]) -> None:
+    """Append calculation trace to OTLP/JSON lines file (readable by OpenTelemetry Collector otlpjsonfile)"""
+    line = json.dumps(otlp_trace(config_id, calculation_id, status, spans), ensure_ascii=False)
+    with _write_lock, open(path, "a", encoding="utf-8") as file:
+        file.write(line + "\n")
@@ -0,0 +1,122 @@
+"""Packing of retrieved documents into the model context"""
+
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+WORDS = re.compile(r"[^\W\d_]+|\d+|[^\w\s]", re.UNICODE)
+
+
+def approx_tokens(text: str) -> int:
+    """
+    Approximate BPE token count: ~4 characters per token for latin words,
+    ~3 for other alphabets (cyrillic), digits by 3, punctuation one each.
+    """
+    count = 0
+    for word in WORDS.findall(text):
+        if word.isdigit():
+            count += -(-len(word) // 3)
+        elif not word.isalpha():
+            count += 1
+        else:
+            count += -(-len(word) // (4 if word.isascii() else 3))
+    return count
+
+
+def overlap(a: str, b: str, min_len: int) -> int:
+    """Length of the longest suffix of a that is a prefix of b, 0 if shorter than min_len"""
+    if len(a) < min_len or len(b) < min_len:
+        return 0
+    probe = b[:min_len]
+    start = a.find(probe, max(0, len(a) - len(b)))
+    while start != -1:
+        if b.startswith(a[start:]):
+            return len(a) - start
+        start = a.find(probe, start + 1)
+    return 0
+
+
+def rank_key(item: Tuple[int, Any]) -> tuple:
+    """Order of (position, document): reranker order, then retriever score, then position"""
+    position, document = item
+    metadata = getattr(document, "metadata", None)
+    metadata = metadata if isinstance(metadata, dict) else dict()
+    if metadata.get("rerank") is not None:
+        return 0, metadata["rerank"], position
+    if metadata.get("score") is not None:
+        return 1, -metadata["score"], position
+    return 2, 0, position
+
+
+def join(a: str, b: str, min_overlap: int) -> Optional[str]:
+    """a and b as one text if one contains the other or they overlap by min_overlap characters, else None"""
+    if b in a:
+        return a
+    if a in b:
+        return b
+    after = overlap(a, b, min_overlap)
+    if after:
+        return a + b[after:]
+    before = overlap(b, a, min_overlap)
+    if before:
+        return b[:-before] + a
+    return None
+
+
+def coalesce(segments: List[str], i: int, min_overlap: int) -> int:
+    """
+    Join segments[i] with every other segment it now overlaps or contains, in place.
+    The joined segment keeps the better (earlier) position. Returns count of segments contained in others.
+    """
+    contained = 0
+    while True:
+        for j, other in enumerate(segments):
+            if j == i:
+                continue
+            joined = join(segments[i], other, min_overlap)
+            if joined is not None:
+                break
+        else:
+            return contained
+        contained += joined in (segments[i], other)
+        segments[min(i, j)] = joined
+        del segments[max(i, j)]
+        i = min(i, j)
+
+
+def pack_documents(documents: List[Any], budget: int, min_overlap: int = 64) -> Tuple[List[str], Dict[str, int]]:
+    """
+    Texts of documents fitting into budget tokens, best first (rank_key).
+    Chunks contained in packed text are skipped as duplicates, chunks overlapping packed text
+    (split_by_const overlap) are joined to it, and so are packed texts bridged by the chunk.
+    Returns texts and counts: packed, merged, duplicates, dropped, tokens.
+    """
+    ranked = sorted(enumerate(documents), key=rank_key)
+    packed: List[str] = []
+    stats = {"packed": 0, "merged": 0, "duplicates": 0, "dropped": 0, "tokens": 0}
+    for _, document in ranked:
+        text = getattr(document, "utf8_content", None)
+        text = str(document) if text is None else text
+        if not text.strip() or any(text in p for p in packed):
+            stats["duplicates"] += 1
+            continue
+        trial, contained = list(packed), 0
+        for i, p in enumerate(trial):
+            joined = join(p, text, min_overlap)
+            if joined is not None:
+                trial[i] = joined
+                contained = int(joined == text)  # packed text inside the chunk
+                contained += coalesce(trial, i, min_overlap)
+                break
+        else:
+            trial.append(text)
+        tokens = sum(approx_tokens(t) for t in trial)
+        if tokens > budget:
+            stats["dropped"] += 1
+            continue
+        # chunks packed before, now inside the joined text, count as duplicates
+        stats["merged"] += len(trial) <= len(packed)
+        stats["packed"] += 1 - contained
+        stats["duplicates"] += contained
+        stats["tokens"] = tokens
+        packed = trial
+    return packed, stats
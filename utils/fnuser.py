@@ -1,28 +1,269 @@
 """Some more tools"""
 
+import os
+import ast
+import json
+import time
+import asyncio
+import hashlib
+import contextvars
 import importlib.util
+from typing import Callable, List, NamedTuple, Optional, Tuple
+from utils.registry import get_default_args
+from utils.tracing import annotate, span, trace
+from utils.profiling import profiled
+
+# True inside batch tasks: streaming helpers stay silent, results are reported per query
+QUIET = contextvars.ContextVar("quiet", default=False)
+# Per query measurements of components (e.g. ttft_ms), added to batch records
+METRICS = contextvars.ContextVar("metrics", default=None)
+
+# Pipelines built in this kernel: config digest -> (component files stamp, fn_dict)
+PIPELINES = dict()
+PIPELINES_MAX = 8
+
+# Component modules executed by get_fn: module file -> (mtime, module)
+MODULES = dict()
+
+
+class Node(NamedTuple):
+    """Pipeline graph node: component function, its settings and timeout in seconds"""
+    fn: Callable
+    settings: dict
+    timeout: Optional[float] = None
+    name: str = ""
+    stage: str = ""
+
+
+async def run_node(node: Node, *args):
+    """Call node function with its settings in a span, TimeoutError after node timeout"""
+    with span(getattr(node, "stage", "") or "node", component=getattr(node, "name", "")):
+        if getattr(node, "timeout", None) is None:
+            result = await node[0](*args, **node[1])
+        else:
+            result = await asyncio.wait_for(node[0](*args, **node[1]), node.timeout)
+        if isinstance(result, str):
+            annotate(chars=len(result))
+        elif isinstance(result, list):
+            annotate(items=len(result))
+        return result
+
+
+def merge_documents(branches: List[list]) -> list:
+    """Default merge of retriever branches: interleaved by rank, duplicates dropped"""
+    seen = set()
+    merged = []
+    for rank in range(max(map(len, branches), default=0)):
+        for documents in branches:
+            if rank >= len(documents):
+                continue
+            key = getattr(documents[rank], "utf8_content", documents[rank])
+            if key not in seen:
+                seen.add(key)
+                merged.append(documents[rank])
+    return merged
+
+
+async def rerank(fn_dict: dict, query: str, documents: list) -> list:
+    """Documents reordered by optional reranker node"""
+    reranker = fn_dict.get("reranker")
+    if reranker is None:
+        return documents
+    return await run_node(reranker, query, documents)
+
+
+async def retrieve(fn_dict: dict, query: str) -> list:
+    """
+    Documents for query. Several retrievers run concurrently, failed or timed out
+    branches are reported and skipped, results are merged by merger node or merge_documents.
+    """
+    retrievers = fn_dict["retriever"]
+    if not isinstance(retrievers, list):
+        return await rerank(fn_dict, query, await run_node(retrievers, query))
+    with span("retrieve", branches=len(retrievers)):
+        results = await asyncio.gather(*(run_node(node, query) for node in retrievers), return_exceptions=True)
+    branches = []
+    for node, result in zip(retrievers, results):
+        if isinstance(result, asyncio.TimeoutError):
+            print(f"Retriever {node.name} timed out after {node.timeout} s")
+            result = []
+        elif isinstance(result, Exception):
+            print(f"Retriever {node.name} failed: {type(result).__name__}: {result}")
+            result = []
+        elif isinstance(result, BaseException):
+            raise result
+        branches.append(result)
+    merger = fn_dict.get("merger")
+    if merger is not None:
+        documents = await run_node(merger, query, branches)
+    else:
+        documents = merge_documents(branches)
+    return await rerank(fn_dict, query, documents)
 
 
 async def exec_task(fn_dict: dict, indexer: bool, **kwargs):
     """code execution"""
     if indexer:
-        result = await fn_dict["indexer"][0](kwargs.get("path", None), **fn_dict["indexer"][1])
+        result = await run_node(fn_dict["indexer"], kwargs.get("path", None))
     else:
         query = kwargs.get("query", None)
-        retreived = await fn_dict["retriever"][0](query, **fn_dict["retriever"][1])
-        augmented = await fn_dict["augmenter"][0](query, retreived, **fn_dict["augmenter"][1])
-        generated = await fn_dict["generator"][0](query, augmented, **fn_dict["generator"][1])
+        with span("query", query_chars=len(query or "")):
+            retreived = await retrieve(fn_dict, query)
+            augmented = await run_node(fn_dict["augmenter"], query, retreived)
+            generated = await run_node(fn_dict["generator"], query, augmented)
 
-def get_fn(path: str):
-    """dynamic function import like from 'module.next.some_function' string"""
+
+async def exec_batch(fn_dict: dict, queries: List[str], concurrency: int = 4):
+    """
+    Batch query execution.
+    Retrieval is done in one call if the only retriever has 'batch' attribute,
+    then queries go through augmenter and generator with limited concurrency.
+    Prints one json line per query.
+    """
+    retriever = fn_dict["retriever"]
+    batched = None if isinstance(retriever, list) else getattr(retriever[0], "batch", None)
+    if batched is not None:
+        retreived = await run_node(Node(batched, retriever[1], getattr(retriever, "timeout", None),
+                                        retriever.name, "retriever_batch"), queries)
+    else:
+        retreived = [None] * len(queries)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def one(i: int, query: str) -> dict:
+        async with semaphore:
+            QUIET.set(True)
+            metrics = dict()
+            METRICS.set(metrics)
+            start = time.perf_counter()
+            try:
+                with span("query", i=i, query_chars=len(query)):
+                    documents = retreived[i]
+                    if documents is None:
+                        documents = await retrieve(fn_dict, query)
+                    else:
+                        documents = await rerank(fn_dict, query, documents)
+                    augmented = await run_node(fn_dict["augmenter"], query, documents)
+                    generated = await run_node(fn_dict["generator"], query, augmented)
+                record = {"i": i, "status": "ok", "answer": generated}
+            except Exception as e:
+                record = {"i": i, "status": "fail", "error": f"{type(e).__name__}: {e}"}
+            record["time"] = round(time.perf_counter() - start, 3)
+            record.update(metrics)
+            print(json.dumps(record, ensure_ascii=False, default=str), flush=True)
+            return record
+
+    results = await asyncio.gather(*(one(i, q) for i, q in enumerate(queries)))
+    ok = sum(1 for r in results if r["status"] == "ok")
+    print(f"Batch finished: {ok}/{len(results)} ok")
+
+
+def resolve(path: str) -> Tuple[str, str, str]:
+    """module name, module file and function name of 'module.next.some_function' string"""
     parts = path.split("^.")
     count = len(parts) - 1
     remaining = parts[-1]
     path_parts = remaining.split(".")
     path = ".".join(path_parts[count:])  # colapse "^." parts
     module_name, fn = path.rsplit(".", 1)
-    module_path = module_name.replace(".", "/") + ".py"
+    return module_name, module_name.replace(".", "/") + ".py", fn
+
+
+def make_node(stage: str, spec: dict) -> Node:
+    """Graph node of config stage {"path", "settings", "timeout"?, "name"?}"""
+    return Node(get_fn(spec["path"]), spec.get("settings", dict()), spec.get("timeout"),
+                spec.get("name", spec["path"]), stage)
+
+
+def load_pipeline(content: str) -> dict:
+    """
+    fn_dict of pipeline config (json text), built once and rebuilt
+    only when config or files of its components change.
+    Stage is one node or, for retriever, a list of nodes executed concurrently;
+    merger and reranker stages are optional.
+    """
+    try:
+        code = json.loads(content)
+    except json.JSONDecodeError:
+        code = ast.literal_eval(content)  # configs saved as python literal
+    digest = hashlib.sha1(content.encode("utf-8")).hexdigest()
+    stamp = []
+    for specs in code.values():
+        for spec in specs if isinstance(specs, list) else [specs]:
+            try:
+                stamp.append(os.stat(resolve(spec["path"])[1]).st_mtime_ns)
+            except OSError:
+                stamp.append(None)
+    cached = PIPELINES.get(digest)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    fn_dict = {k: [make_node(k, spec) for spec in v] if isinstance(v, list) else make_node(k, v)
+               for k, v in code.items()}
+    if len(PIPELINES) >= PIPELINES_MAX:
+        PIPELINES.pop(next(iter(PIPELINES)))
+    PIPELINES[digest] = (stamp, fn_dict)
+    preload(fn_dict)
+    return fn_dict
+
+
+def preload(fn_dict: dict):
+    """
+    Call 'preload' attribute of node functions with node settings (defaults included)
+    when the pipeline is built, e.g. to load the generator model before the first query.
+    """
+    for nodes in fn_dict.values():
+        for node in nodes if isinstance(nodes, list) else [nodes]:
+            hook = getattr(node.fn, "preload", None)
+            if hook is None:
+                continue
+            try:
+                hook(**{**get_default_args(node.fn), **node.settings})
+            except Exception as e:
+                print(f"Preload of {node.name} failed: {type(e).__name__}: {e}")
+
+
+async def run_request(payload: str):
+    """
+    Run request passed as json text, so query text never becomes code:
+    {"content", "kind": "run"|"run_batch", "indexer", "path_or_query", "profile"?}
+    or {..., "queries", "concurrency"}
+    """
+    await execute_request(json.loads(payload))
+
+
+async def execute_request(request: dict):
+    """
+    Run request dict of run_request, its spans are emitted at the end (utils.tracing).
+    With "profile" set execution is profiled (utils.profiling).
+    """
+    with trace():
+        with span("load_pipeline"):
+            fn_dict = load_pipeline(request["content"])
+        with profiled(request.get("profile", False)):
+            if request["kind"] == "run_batch":
+                await exec_batch(fn_dict, request["queries"], request["concurrency"])
+            elif request["indexer"]:
+                await exec_task(fn_dict, True, path=request["path_or_query"])
+            else:
+                await exec_task(fn_dict, False, query=request["path_or_query"])
+
+
+def load_module(module_name: str, module_path: str):
+    """Module executed from file, once per file version (MODULES)"""
+    try:
+        stamp = os.stat(module_path).st_mtime_ns
+    except OSError:
+        stamp = None
+    cached = MODULES.get(module_path)
+    if cached is not None and cached[0] == stamp and stamp is not None:
+        return cached[1]
     module_spec = importlib.util.spec_from_file_location(module_name, module_path)
     module = importlib.util.module_from_spec(module_spec)
     module_spec.loader.exec_module(module)
-    return getattr(module, fn)
+    MODULES[module_path] = (stamp, module)
+    return module
+
+
+def get_fn(path: str):
+    """dynamic function import like from 'module.next.some_function' string"""
+    module_name, module_path, fn = resolve(path)
+    return getattr(load_module(module_name, module_path), fn)
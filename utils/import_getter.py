@@ -21,8 +21,21 @@ def get_imports(path):
         for n in node.names:
             yield Import(module, n.name.split('.'), n.asname)
 
+def get_lazy_imports(path):
+    """Get `name = lazy("module")` assignments (utils.lazy) from file"""
+    with open(path, encoding="utf-8") as fh:
+        root = ast.parse(fh.read(), path)
+
+    for node in ast.iter_child_nodes(root):
+        if (isinstance(node, ast.Assign) and len(node.targets) == 1
+                and isinstance(node.targets[0], ast.Name)
+                and isinstance(node.value, ast.Call)
+                and isinstance(node.value.func, ast.Name) and node.value.func.id == "lazy"
+                and len(node.value.args) == 1 and isinstance(node.value.args[0], ast.Constant)):
+            yield node.targets[0].id, node.value.args[0].value
+
 def get_imports_as_string(path):
-    """Get imports from file as a single string"""
+    """Get imports and lazy imports from file as a single string"""
     lines = []
     for imp in get_imports(path):
         module_path = ".".join(imp.module)
@@ -38,4 +51,8 @@ def get_imports_as_string(path):
 
         lines.append(line)
 
+    lazy_lines = [f'{name} = lazy("{module}")' for name, module in get_lazy_imports(path)]
+    if lazy_lines:
+        lines += [""] + lazy_lines
+
     return "\n".join(lines)
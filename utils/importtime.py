@@ -0,0 +1,45 @@
+"""Import cost report of kernel and component modules (python -X importtime)"""
+
+import re
+import sys
+import time
+import subprocess
+from typing import Any, Dict, List
+
+LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def parse(stderr: str) -> List[Dict[str, Any]]:
+    """Records of -X importtime output: module, self_ms, cumulative_ms, depth"""
+    records = []
+    for line in stderr.splitlines():
+        match = LINE.match(line)
+        if match is not None:
+            own, cumulative, indent, module = match.groups()
+            records.append({"module": module, "self_ms": int(own) / 1000,
+                            "cumulative_ms": int(cumulative) / 1000, "depth": len(indent) // 2})
+    return records
+
+
+def import_report(code: str, limit: int = 25, cwd: str | None = None) -> Dict[str, Any]:
+    """
+    Run code in a fresh interpreter with -X importtime.
+    Total is the sum of self times, top lists modules by self and cumulative time.
+    """
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                            capture_output=True, text=True, cwd=cwd, check=False)
+    wall = time.perf_counter() - start
+    records = parse(result.stderr)
+    errors = [line for line in result.stderr.splitlines() if not line.startswith("import time:")]
+    top_level = [r for r in records if r["depth"] == 0]
+    return {
+        "code": code,
+        "ok": result.returncode == 0,
+        "error": "\n".join(errors[-5:]) if result.returncode else None,
+        "wall_ms": round(1000 * wall, 1),
+        "imports_ms": round(sum(r["self_ms"] for r in records), 1),
+        "modules": len(records),
+        "top_level": sorted(top_level, key=lambda r: r["cumulative_ms"], reverse=True)[:limit],
+        "top_self": sorted(records, key=lambda r: r["self_ms"], reverse=True)[:limit],
+    }
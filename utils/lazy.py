@@ -0,0 +1,40 @@
+"""Lazy imports: module is imported on first attribute access"""
+
+import sys
+import types
+import importlib
+import threading
+
+
+class LazyModule(types.ModuleType):
+    """Stand-in of module name, imports it when some attribute is needed"""
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.__dict__["_lazy_module"] = None
+        self.__dict__["_lazy_lock"] = threading.Lock()
+
+    def _load(self) -> types.ModuleType:
+        with self._lazy_lock:
+            if self._lazy_module is None:
+                self.__dict__["_lazy_module"] = importlib.import_module(self.__name__)
+        return self._lazy_module
+
+    def __getattr__(self, attr: str):
+        return getattr(self._lazy_module or self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self) -> str:
+        state = "loaded" if self._lazy_module is not None else "not loaded"
+        return f"<lazy module '{self.__name__}' ({state})>"
+
+
+def lazy(name: str) -> types.ModuleType:
+    """
+    Module name if it is already imported, otherwise LazyModule.
+    Use at module level: `httpx = lazy("httpx")`, then `httpx.AsyncClient()` inside functions.
+    """
+    module = sys.modules.get(name)
+    return module if module is not None else LazyModule(name)
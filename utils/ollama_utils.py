@@ -1,7 +1,12 @@
 """Ollama utils"""
 
+import time
 from typing import List
-import ollama
+from utils.lazy import lazy
+from utils.fnuser import METRICS, QUIET
+from utils.tracing import annotate
+
+ollama = lazy("ollama")  # imports httpx and pydantic, loaded on first request
 
 
 def check_ollama() -> bool:
@@ -45,8 +50,22 @@ def ollama_model(model: str) -> bool:
     return False
 
 
-async def ollama_chat_completion(ollama_host: str, model: str, messages, temperature=None, seed=None, num_ctx=None):
-    """Async streaming example"""
+def ollama_preload(ollama_host: str, model: str, keep_alive=None) -> bool:
+    """Load model into memory (generate request without prompt), True if loaded"""
+    try:
+        ollama.Client(host=ollama_host).generate(model=model, prompt="", keep_alive=keep_alive)
+    except Exception as e:
+        print(f"Preloading {model} failed: {e}")
+        return False
+    return True
+
+
+async def ollama_chat_completion(ollama_host: str, model: str, messages, temperature=None, seed=None, num_ctx=None,
+                                 keep_alive=None):
+    """
+    Async streaming example, returns full answer.
+    Time to first token and generation rate go to the current span and METRICS.
+    """
     options = dict()
     if temperature is not None:
         options["temperature"] = temperature
@@ -54,9 +73,35 @@ async def ollama_chat_completion(ollama_host: str, model: str, messages, tempera
         options["seed"] = seed
     if num_ctx is not None:
         options["num_ctx"] = num_ctx
-    async for part in await ollama.AsyncClient(host=ollama_host).chat(model=model, messages=messages, options=options, stream=True):
-        print(part['message']['content'], end='', flush=True)
-    print("")
+    quiet = QUIET.get()
+    answer = []
+    start = time.perf_counter()
+    first = None
+    metrics = METRICS.get()
+    stream = await ollama.AsyncClient(host=ollama_host).chat(model=model, messages=messages, options=options,
+                                                             stream=True, keep_alive=keep_alive)
+    async for part in stream:
+        if first is None:
+            first = time.perf_counter()
+        answer.append(part['message']['content'])
+        if not quiet:
+            print(part['message']['content'], end='', flush=True)
+        if part.get('done'):
+            # ollama reports token counts and durations (ns) in the last chunk
+            tokens = part.get('eval_count') or 0
+            duration = part.get('eval_duration') or 0
+            rate = round(tokens / (duration / 1e9), 1) if duration else None
+            annotate(prompt_tokens=part.get('prompt_eval_count'), tokens=tokens, tokens_per_s=rate)
+            if metrics is not None:
+                metrics.update(prompt_tokens=part.get('prompt_eval_count'), tokens_per_s=rate)
+    ttft = round(1000 * (first - start), 1) if first is not None else None
+    annotate(ttft_ms=ttft)
+    if metrics is not None:
+        metrics["ttft_ms"] = ttft
+    if not quiet:
+        print("")
+        print(f"⏱ TTFT {ttft} ms")
+    return "".join(answer)
 
 
 async def ollama_embed(ollama_host: str, ollama_timeout, ollama_embedding_model: str, texts: List[str]):
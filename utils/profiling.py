@@ -0,0 +1,86 @@
+"""Optional cProfile of pipeline runs"""
+
+import base64
+import marshal
+import cProfile
+import threading
+import contextvars
+from pathlib import Path
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+from utils.tracing import publish
+
+# display_data mime type carrying profile of a kernel run to the server
+PROFILE_MIME = "application/vnd.kme.profile+json"
+
+# Receiver of profiles for runs outside of kernels, kernels publish display_data instead
+SINK: contextvars.ContextVar[Optional[Callable[[Dict[str, Any]], None]]] = contextvars.ContextVar(
+    "kme_profile_sink", default=None)
+# cProfile uses process-wide sys.monitoring since python 3.12, a second enabled profiler fails
+_LOCK = threading.Lock()
+
+
+def _row(key, value) -> Dict[str, Any]:
+    filename, line, name = key
+    primitive_calls, calls, tottime, cumtime, _ = value
+    return {"function": name, "file": filename, "line": line, "calls": calls,
+            "primitive_calls": primitive_calls, "tottime_s": round(tottime, 6), "cumtime_s": round(cumtime, 6)}
+
+
+def summary(stats: Dict[tuple, tuple], limit: int = 20) -> Dict[str, Any]:
+    """Top functions by cumulative time, overall and in components/ scripts"""
+    rows = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)
+    return {
+        "total_s": round(sum(value[2] for value in stats.values()), 6),
+        "functions": len(stats),
+        "top_cumulative": [_row(k, v) for k, v in rows[:limit]],
+        "components": [_row(k, v) for k, v in rows if "components" in Path(k[0]).parts][:limit],
+    }
+
+
+def dumps(stats: Dict[tuple, tuple]) -> bytes:
+    """Profile artifact, same format as cProfile.Profile.dump_stats (.prof for pstats, snakeviz)"""
+    return marshal.dumps(stats)
+
+
+def loads(artifact: bytes) -> Dict[tuple, tuple]:
+    """Stats of profile artifact made by dumps"""
+    return marshal.loads(artifact)
+
+
+def emit(profile: cProfile.Profile) -> None:
+    """Pass {"artifact": base64, "summary"} to SINK or publish it from the kernel as display_data"""
+    profile.create_stats()
+    publish(SINK, PROFILE_MIME, {"artifact": base64.b64encode(dumps(profile.stats)).decode("ascii"),
+                                 "summary": summary(profile.stats)})
+
+
+@contextmanager
+def profiled(enabled: bool = True):
+    """
+    Profile code inside with cProfile and emit the result.
+    The profiler is process-wide: code of all threads running meanwhile is profiled too,
+    e.g. other runs of in-process workers. One profile at a time, other runs go without it.
+    """
+    if not enabled:
+        yield None
+        return
+    if not _LOCK.acquire(blocking=False):
+        print("Profile skipped: another run is being profiled")
+        yield None
+        return
+    try:
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError as e:  # other profiler or debugger of the process
+            print(f"Profile skipped: {e}")
+            yield None
+            return
+        try:
+            yield profile
+        finally:
+            profile.disable()
+            emit(profile)
+    finally:
+        _LOCK.release()
@@ -1,12 +1,13 @@
 """Readers of different paths"""
 
 from urllib.parse import urljoin
-from markdownify import markdownify
-from bs4 import BeautifulSoup
-import httpx
+from utils.lazy import lazy
 
+bs4 = lazy("bs4")
+markdownify = lazy("markdownify")
 
-async def html_to_md(client: httpx.AsyncClient, url: str) -> str:
+
+async def html_to_md(client: "httpx.AsyncClient", url: str) -> str:
     """Download html by url and convert to md"""
     try:
         timeout = 5
@@ -14,11 +15,11 @@ async def html_to_md(client: httpx.AsyncClient, url: str) -> str:
         if not response.is_success:
             return ""
         html_content = response.text
-        soup = BeautifulSoup(html_content, 'html.parser')
+        soup = bs4.BeautifulSoup(html_content, 'html.parser')
         for tag in soup.find_all(['a', 'link', 'script', 'img']):
             attr = 'href' if tag.name in ['a', 'link'] else 'src'
             if tag.has_attr(attr):
                 tag[attr] = urljoin(url, tag[attr])
-        return markdownify(str(soup).replace(url + '#', ""))
+        return markdownify.markdownify(str(soup).replace(url + '#', ""))
     except Exception as e:
         return ""
@@ -1,14 +1,20 @@
 """Central registry and register decorator for function registration."""
 
+import ast
 import inspect
 
 REGISTRY = {
     "indexer": dict(),
     "retriever": dict(),
+    "merger": dict(),
+    "reranker": dict(),
     "augmenter": dict(),
     "generator": dict()
 }
 
+# Stages every pipeline config has, the rest are optional
+REQUIRED_STAGES = ("indexer", "retriever", "augmenter", "generator")
+
 
 def get_default_args(func):
     """Default component settings"""
@@ -29,3 +35,45 @@ def register(category: str):
         REGISTRY[category][key].append(get_default_args(fn))
         return fn
     return decorator
+
+
+def _decorator_category(node: ast.expr):
+    """'category' if node is register("category") call, else None"""
+    if not isinstance(node, ast.Call) or len(node.args) != 1:
+        return None
+    func = node.func
+    name = func.id if isinstance(func, ast.Name) else getattr(func, "attr", None)
+    arg = node.args[0]
+    if name == "register" and isinstance(arg, ast.Constant) and isinstance(arg.value, str):
+        return arg.value
+    return None
+
+
+def _static_default_args(args: ast.arguments):
+    """Default component settings without execution, ValueError if some are not literals"""
+    positional = args.posonlyargs + args.args
+    pairs = list(zip(positional[len(positional) - len(args.defaults):], args.defaults))
+    pairs += [(a, d) for a, d in zip(args.kwonlyargs, args.kw_defaults) if d is not None]
+    return {a.arg: ast.literal_eval(d) for a, d in pairs}
+
+
+def scan_source(module_name: str, source: str, filename: str = "<string>"):
+    """
+    REGISTRY entries of module source extracted with ast, module is not imported.
+    Same layout as register() produces: [source lines, first line number, default args].
+    Raises ValueError if some default args are not literals.
+    """
+    root = ast.parse(source, filename)
+    lines = source.splitlines(keepends=True)
+    found = dict()
+    for node in root.body:
+        if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            continue
+        categories = [c for c in map(_decorator_category, node.decorator_list) if c is not None]
+        if not categories:
+            continue
+        start = min(d.lineno for d in node.decorator_list)
+        entry = [lines[start - 1:node.end_lineno], start, _static_default_args(node.args)]
+        for category in categories:
+            found.setdefault(category, dict())[f"{module_name}.{node.name}"] = entry
+    return found
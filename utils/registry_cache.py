@@ -0,0 +1,89 @@
+"""Registry of component scripts cached by file mtime and hash"""
+
+import sys
+import hashlib
+import importlib
+from pathlib import Path
+from typing import Any, Dict, List
+
+from utils import registry
+
+
+class RegistryCache:
+    """
+    Per-script registry entries.
+    Changed scripts are scanned statically (utils.registry.scan_source),
+    only scripts with non-literal default args are imported.
+    """
+
+    def __init__(self):
+        self.scripts: Dict[str, Dict[str, Any]] = dict()  # path: {"stamp", "hash", "found"}
+
+    @staticmethod
+    def file_of(path: str) -> Path:
+        """File of the script with python path like components.default"""
+        return Path(path.replace(".", "/") + ".py")
+
+    def refresh(self, scripts: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Registry for given Script records (dicts with 'path' and 'hidden'),
+        only changed scripts are rescanned.
+        """
+        paths = [s["path"] for s in scripts]
+        for path in set(self.scripts) - set(paths):
+            del self.scripts[path]
+        ret = {category: dict() for category in registry.REGISTRY}
+        for path in paths:
+            for category, entries in self.scan(path).items():
+                ret.setdefault(category, dict()).update(entries)
+        ret["hidden"] = [s["path"] for s in scripts if s["hidden"]]
+        return ret
+
+    def scan(self, path: str) -> Dict[str, Dict[str, list]]:
+        """Registry entries of one script, rescanned if file changed"""
+        file = self.file_of(path)
+        try:
+            stat = file.stat()
+        except OSError as e:
+            print(f"Script '{path}' is not available: {e}")
+            self.scripts.pop(path, None)
+            return dict()
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        cached = self.scripts.get(path)
+        if cached is not None and cached["stamp"] == stamp:
+            return cached["found"]
+        source = file.read_bytes()
+        digest = hashlib.sha1(source).hexdigest()
+        if cached is not None and cached["hash"] == digest:
+            cached["stamp"] = stamp
+            return cached["found"]
+        try:
+            found = registry.scan_source(path, source.decode("utf-8"), str(file))
+        except ValueError:
+            found = self.import_entries(path)
+        except SyntaxError as e:
+            print(f"Script '{path}' has syntax error: {e}")
+            found = dict()
+        self.scripts[path] = {"stamp": stamp, "hash": digest, "found": found}
+        return found
+
+    @staticmethod
+    def import_entries(path: str) -> Dict[str, Dict[str, list]]:
+        """Fallback: import script so register() fills REGISTRY, then take its entries"""
+        prefix = path + "."
+        for entries in registry.REGISTRY.values():
+            for key in [k for k in entries if k.startswith(prefix)]:
+                del entries[key]
+        sys.modules.pop(path, None)
+        try:
+            importlib.import_module(path)
+        except Exception as e:
+            print(f"Script '{path}' import failed: {e}")
+            return dict()
+        return {
+            category: {k: v for k, v in entries.items() if k.startswith(prefix)}
+            for category, entries in registry.REGISTRY.items()
+        }
+
+
+REGISTRY_CACHE = RegistryCache()
@@ -0,0 +1,89 @@
+"""CPU reranking of retrieved candidates: lexical overlap and MMR diversity"""
+
+import re
+from typing import Any, Dict, List, Set
+from utils.lazy import lazy
+
+np = lazy("numpy")
+
+TERMS = re.compile(r"\w+", re.UNICODE)
+
+
+def terms(text: str, stem: int = 6) -> Set[str]:
+    """Lowercase words cut to stem characters (cheap stemming for russian endings), short words skipped"""
+    return {w[:stem] for w in TERMS.findall(text.lower()) if len(w) > 2 or w.isdigit()}
+
+
+def lexical_scores(query: str, texts: List[str]):
+    """Share of query terms in every text weighted by idf among texts, 0..1"""
+    query_terms = sorted(terms(query))
+    if not query_terms or not texts:
+        return np.zeros(len(texts))
+    text_terms = [terms(t) for t in texts]
+    present = np.array([[t in d for t in query_terms] for d in text_terms], dtype=np.float64)
+    df = present.sum(axis=0)
+    idf = np.log1p((len(texts) - df + 0.5) / (df + 0.5))
+    return present @ idf / idf.sum()
+
+
+def similarity(texts: List[str], vectors: List[Any] | None):
+    """Cosine similarity matrix of vectors, or term Jaccard similarity without them"""
+    if vectors is not None:
+        matrix = np.asarray(vectors, dtype=np.float32)
+        matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+        return matrix @ matrix.T
+    text_terms = [terms(t) for t in texts]
+    vocabulary = {t: i for i, t in enumerate(set().union(*text_terms))}
+    present = np.zeros((len(texts), len(vocabulary)), dtype=np.float32)
+    for row, found in enumerate(text_terms):
+        present[row, [vocabulary[t] for t in found]] = 1.0
+    common = present @ present.T
+    sizes = present.sum(axis=1)
+    return common / np.maximum(sizes[:, None] + sizes[None, :] - common, 1.0)
+
+
+def normalized(values):
+    """Values scaled to 0..1, all ones if they are equal"""
+    spread = values.max() - values.min() if len(values) else 0
+    return (values - values.min()) / spread if spread > 0 else np.ones_like(values)
+
+
+def mmr(relevance, similarities, top_n: int, diversity: float) -> List[int]:
+    """Maximal marginal relevance selection: indices in selection order"""
+    selected: List[int] = []
+    closest = np.zeros(len(relevance))  # max similarity to selected
+    for _ in range(min(top_n, len(relevance))):
+        scores = (1 - diversity) * relevance - diversity * closest
+        scores[selected] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        closest = np.maximum(closest, similarities[best])
+    return selected
+
+
+def rerank_documents(query: str, documents: List[Any], top_n: int, lexical_weight: float,
+                     diversity: float) -> List[Any]:
+    """
+    top_n documents: relevance mixes normalized retriever score (metadata["score"]) and
+    lexical overlap, MMR over stored vectors (metadata["vector"]) or terms keeps them diverse.
+    Selected documents get metadata "rerank" (position) and "relevance".
+    """
+    if not documents:
+        return []
+    metadata: List[Dict[str, Any]] = [d.metadata if isinstance(getattr(d, "metadata", None), dict) else dict()
+                                      for d in documents]
+    texts = [getattr(d, "utf8_content", None) or str(d) for d in documents]
+    lexical = lexical_scores(query, texts)
+    scores = [m.get("score") for m in metadata]
+    if all(s is not None for s in scores):
+        relevance = (1 - lexical_weight) * normalized(np.asarray(scores, dtype=np.float64)) + lexical_weight * lexical
+    else:
+        relevance = lexical
+    vectors = [m.get("vector") for m in metadata]
+    similarities = similarity(texts, vectors if all(v is not None for v in vectors) else None)
+    reranked = []
+    for position, i in enumerate(mmr(relevance, similarities, top_n, diversity)):
+        metadata[i].update(rerank=position, relevance=round(float(relevance[i]), 4))
+        documents[i].metadata = metadata[i]
+        reranked.append(documents[i])
+    return reranked
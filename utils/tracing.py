@@ -0,0 +1,86 @@
+"""Per-stage spans of pipeline runs"""
+
+import time
+import itertools
+import contextvars
+from contextlib import contextmanager
+from typing import Any, Callable, List, Optional
+
+# display_data mime type carrying spans of a kernel run to the server
+SPANS_MIME = "application/vnd.kme.spans+json"
+
+# Finished spans of the current run, None outside of traced runs
+_TRACE: contextvars.ContextVar[Optional[list]] = contextvars.ContextVar("kme_trace", default=None)
+# Innermost open span
+_CURRENT: contextvars.ContextVar[Optional[dict]] = contextvars.ContextVar("kme_span", default=None)
+# Receiver of spans for runs outside of kernels, kernels publish display_data instead
+SINK: contextvars.ContextVar[Optional[Callable[[List[dict]], None]]] = contextvars.ContextVar(
+    "kme_spans_sink", default=None)
+
+_IDS = itertools.count(1)
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """
+    Record a stage of the current run: start/end in unix nanoseconds, duration and attributes.
+    Does nothing outside of trace().
+    """
+    trace = _TRACE.get()
+    if trace is None:
+        yield None
+        return
+    parent = _CURRENT.get()
+    record = {"id": next(_IDS), "parent": None if parent is None else parent["id"],
+              "name": name, "start": time.time_ns(), "attrs": dict(attrs)}
+    token = _CURRENT.set(record)
+    try:
+        yield record
+    except BaseException as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _CURRENT.reset(token)
+        record["end"] = time.time_ns()
+        record["duration_ms"] = round((record["end"] - record["start"]) / 1e6, 3)
+        trace.append(record)
+
+
+def annotate(**attrs) -> None:
+    """Add attributes (sizes, counts, rates) to the innermost open span"""
+    current = _CURRENT.get()
+    if current is not None:
+        current["attrs"].update(attrs)
+
+
+def publish(sink: contextvars.ContextVar[Optional[Callable[[Any], None]]], mime: str, data: Any) -> None:
+    """Pass run data to the sink if set, otherwise publish it from the kernel as display_data of mime"""
+    receiver = sink.get()
+    if receiver is not None:
+        receiver(data)
+        return
+    try:
+        from IPython import get_ipython
+        from IPython.display import display
+    except ImportError:
+        return
+    if get_ipython() is not None:
+        display({mime: data}, raw=True)
+
+
+def emit(spans: List[dict]) -> None:
+    """Pass spans to SINK or publish them from the kernel as display_data"""
+    publish(SINK, SPANS_MIME, spans)
+
+
+@contextmanager
+def trace():
+    """Collect spans of the run inside, emit them at the end"""
+    spans = []
+    token = _TRACE.set(spans)
+    try:
+        yield spans
+    finally:
+        _TRACE.reset(token)
+        if spans:
+            emit(sorted(spans, key=lambda s: s["start"]))